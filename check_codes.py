@@ -13,13 +13,13 @@ async def check():
     code = "1232"
     now = datetime.now()
     
-    # Same query as get_video_by_code
+    # Same query as Repository.get_videos_by_code
     rows = await conn.fetch('''
         SELECT title, quality, file_id, views_count, id, file_type, storage_channel_id, storage_message_id FROM videos 
         WHERE code = $1 AND (expires_at IS NULL OR expires_at > $2)
     ''', code, now)
     
-    print(f"get_video_by_code('{code}'): found {len(rows)} results")
+    print(f"repo.get_videos_by_code('{code}'): found {len(rows)} results")
     for r in rows:
         print(f"  Title: {r['title'][:40]}...")
     
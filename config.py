@@ -10,7 +10,75 @@ INSTAGRAM_LINK = "https://www.instagram.com/nova_kino.uz/"
 STORAGE_CHANNEL_ID = os.getenv("STORAGE_CHANNEL_ID", "@nova_storage") # Replace with your channel ID or username
 WELCOME_PHOTO = os.path.join(os.path.dirname(__file__), "banner.jpg")
 DATABASE_NAME = "bot_database.db"
+
+# Webhook mode (opt-in): set WEBHOOK_URL to the public base URL of this server
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "50"))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
 DAILY_LIMIT = 5
+# Daily requests per user tier ("tier:limit,..."); a limit of 0 means unlimited
+QUOTA_TIERS = {
+    tier.strip(): int(limit)
+    for tier, limit in (item.split(":") for item in os.getenv("QUOTA_TIERS", f"free:{DAILY_LIMIT}").split(",") if ":" in item)
+}
+SEARCH_PAGE_SIZE = 10
+
+# FSM storage: abandoned states are removed after FSM_STATE_TTL seconds
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", str(7 * 86400)))
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "2"))
+
+# Per-user throttling (tokens per second, burst size)
+THROTTLE_MESSAGE_RATE = float(os.getenv("THROTTLE_MESSAGE_RATE", "1"))
+THROTTLE_MESSAGE_BURST = int(os.getenv("THROTTLE_MESSAGE_BURST", "5"))
+THROTTLE_CALLBACK_RATE = float(os.getenv("THROTTLE_CALLBACK_RATE", "2"))
+THROTTLE_CALLBACK_BURST = int(os.getenv("THROTTLE_CALLBACK_BURST", "8"))
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", "100000"))
+
+# asyncpg pool. Use DB_STATEMENT_CACHE_SIZE=0 behind a transaction-mode pooler (e.g. Neon "-pooler" hosts)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+# Idle connections are pinged this often (seconds) so a serverless endpoint stays warm; 0 disables
+DB_KEEPALIVE_INTERVAL = float(os.getenv("DB_KEEPALIVE_INTERVAL", "60"))
+
+# Bearer token for the import/export endpoints; both are disabled while it is empty
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+# Largest accepted /api/import_movies upload (bytes)
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Write-behind buffer for users.last_seen
+LAST_SEEN_FLUSH_INTERVAL = float(os.getenv("LAST_SEEN_FLUSH_INTERVAL", "30"))
+LAST_SEEN_BUFFER_SIZE = int(os.getenv("LAST_SEEN_BUFFER_SIZE", "50000"))
+
+# Batched videos.views_count increments
+VIEWS_FLUSH_INTERVAL = float(os.getenv("VIEWS_FLUSH_INTERVAL", "10"))
+
+# Per-user profile cache (language, daily quota)
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "50000"))
+PROFILE_CACHE_IDLE_TTL = float(os.getenv("PROFILE_CACHE_IDLE_TTL", "900"))
+# Entries are reloaded this long after they were read from the database, even for active users
+PROFILE_CACHE_MAX_AGE = float(os.getenv("PROFILE_CACHE_MAX_AGE", "300"))
+
+# Channel membership cache (seconds)
+MEMBERSHIP_POSITIVE_TTL = float(os.getenv("MEMBERSHIP_POSITIVE_TTL", "600"))
+MEMBERSHIP_NEGATIVE_TTL = float(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "20"))
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "100000"))
+
+# Broadcast engine (Telegram allows ~30 messages/s per bot)
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "10"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+# Users per checkpoint: at most this many are re-sent after a crash
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "200"))
+# A running job is taken over by another instance when its owner stops renewing the lease (seconds)
+BROADCAST_LEASE_TTL = float(os.getenv("BROADCAST_LEASE_TTL", "60"))
+# Telegram lets bots delete messages for 48 hours; sent message ids are dropped after that
+BROADCAST_DELETE_WINDOW = float(os.getenv("BROADCAST_DELETE_WINDOW", str(48 * 3600)))
+BROADCAST_RETENTION_INTERVAL = float(os.getenv("BROADCAST_RETENTION_INTERVAL", "3600"))
 
 LANGUAGES = {
     'uz': '🇺🇿 O\'zbekcha',
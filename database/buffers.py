@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Collects writes in memory and flushes them in bulk from a background task.
+
+    Subclasses keep their pending data in self._pending (a dict) and implement
+    _write() with a single set-based statement and _restore() for failed batches.
+    """
+
+    name = "buffer"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._pool = None
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    def start(self, pool):
+        self._pool = pool
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ {self.name} yozilmadi: {e}")
+
+    async def flush(self):
+        if not self._pending or self._pool is None:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            async with self._pool.acquire() as conn:
+                await self._write(conn, batch)
+        except Exception:
+            self._restore(batch)
+            raise
+        return len(batch)
+
+    async def _write(self, conn, batch):
+        raise NotImplementedError
+
+    def _restore(self, batch):
+        raise NotImplementedError
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            flushed = await self.flush()
+            if flushed:
+                logger.info(f"✅ {self.name}: {flushed} ta yozuv saqlandi.")
+        except Exception as e:
+            logger.error(f"❌ Yakuniy {self.name} yozilmadi: {e}")
+
+
+class LastSeenBuffer(WriteBehindBuffer):
+    """
+    Write-behind buffer for users.last_seen.
+
+    Every update only records the latest time per telegram_id in memory; a
+    flush writes them all with one UNNEST statement. Times are kept as
+    monotonic readings and turned into database time at flush
+    (CURRENT_TIMESTAMP minus their age), so last_seen stays on the same clock
+    and time zone as the column default and the queries comparing it with
+    CURRENT_TIMESTAMP, whatever the container's zone.
+    """
+
+    name = "last_seen"
+
+    def __init__(self, interval, max_size):
+        super().__init__(interval)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def touch(self, telegram_id):
+        if telegram_id not in self._pending and len(self._pending) >= self.max_size:
+            # Buffer is full and a flush is already requested; skip new ids
+            self.dropped += 1
+            self._wakeup.set()
+            return
+        self._pending[telegram_id] = time.monotonic()
+        if len(self._pending) >= self.max_size:
+            self._wakeup.set()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    async def _write(self, conn, batch):
+        now = time.monotonic()
+        await conn.execute('''
+            UPDATE users AS u
+            SET last_seen = v.seen,
+                -- Interacting again means the bot is no longer blocked
+                blocked_at = CASE WHEN u.blocked_at < v.seen THEN NULL ELSE u.blocked_at END
+            FROM (
+                SELECT telegram_id, CURRENT_TIMESTAMP - make_interval(secs => age) AS seen
+                FROM UNNEST($1::bigint[], $2::float8[]) AS a(telegram_id, age)
+            ) AS v
+            WHERE u.telegram_id = v.telegram_id
+              AND (u.last_seen IS NULL OR u.last_seen < v.seen)
+        ''', list(batch.keys()), [now - touched for touched in batch.values()])
+
+    def _restore(self, batch):
+        # Put the batch back without overwriting newer timestamps
+        for telegram_id, seen in batch.items():
+            if telegram_id not in self._pending:
+                self._pending[telegram_id] = seen
+
+
+class ViewCounter(WriteBehindBuffer):
+    """Accumulates views_count increments per video and adds them in bulk."""
+
+    name = "views_count"
+
+    def increment(self, video_id, n=1):
+        video_id = int(video_id)
+        self._pending[video_id] = self._pending.get(video_id, 0) + n
+
+    @property
+    def pending(self):
+        return sum(self._pending.values())
+
+    async def _write(self, conn, batch):
+        await conn.execute('''
+            UPDATE videos AS v SET views_count = v.views_count + d.n
+            FROM UNNEST($1::int[], $2::int[]) AS d(id, n)
+            WHERE v.id = d.id
+        ''', list(batch.keys()), list(batch.values()))
+
+    def _restore(self, batch):
+        for video_id, n in batch.items():
+            self.increment(video_id, n)
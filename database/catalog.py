@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from datetime import datetime
+
+import asyncpg
+
+from database.models import Video, VIDEO_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channel used to keep every replica's snapshot in sync
+CHANNEL = "catalog_changed"
+# Payload asking every replica for a full reload instead of a per-code refresh (bulk changes)
+RELOAD = "*"
+
+# code -> list of (expires_at, Video)
+_index = {}
+_ready = False
+_listener_conn = None
+_closing = False
+_tasks = set()
+
+stats = {"hits": 0, "misses": 0, "fallbacks": 0, "reloads": 0}
+
+# Bumped on every change, so derived snapshots (e.g. /api/movies) know when to rebuild
+version = 0
+
+
+def _changed():
+    global version
+    version += 1
+
+
+def _spawn(coro):
+    task = asyncio.get_running_loop().create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def load(pool):
+    """Loads the whole unexpired catalog into memory."""
+    global _index, _ready
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(f'''
+            SELECT {VIDEO_COLUMNS} FROM videos
+            WHERE expires_at IS NULL OR expires_at > $1
+            ORDER BY id
+        ''', datetime.now())
+    index = {}
+    for row in rows:
+        video = Video(*row)
+        index.setdefault(video.code, []).append((video.expires_at, video))
+    _index = index
+    _ready = True
+    _changed()
+    stats["reloads"] += 1
+    logger.info(f"📦 Katalog xotiraga yuklandi: {len(index)} ta kod.")
+
+
+async def refresh_code(pool, code):
+    """Re-reads a single code from the database (used after NOTIFY)."""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(f'''
+            SELECT {VIDEO_COLUMNS} FROM videos
+            WHERE code = $1 AND (expires_at IS NULL OR expires_at > $2)
+            ORDER BY id
+        ''', code, datetime.now())
+    if rows:
+        _index[code] = [(video.expires_at, video) for video in (Video(*row) for row in rows)]
+    else:
+        _index.pop(code, None)
+    _changed()
+
+
+def lookup(code):
+    """
+    Returns the list of Video objects for a code, or None when the snapshot
+    is not loaded and the caller has to go to the database.
+    """
+    if not _ready:
+        stats["fallbacks"] += 1
+        return None
+    entries = _index.get(code)
+    if entries:
+        now = datetime.now()
+        alive = [entry for entry in entries if entry[0] is None or entry[0] > now]
+        if len(alive) != len(entries):
+            if alive:
+                _index[code] = alive
+            else:
+                _index.pop(code, None)
+            _changed()
+        if alive:
+            stats["hits"] += 1
+            return [video for _, video in alive]
+    stats["misses"] += 1
+    return []
+
+
+def put(video):
+    if video.expires_at is not None and video.expires_at <= datetime.now():
+        return
+    _index.setdefault(video.code, []).append((video.expires_at, video))
+    _changed()
+
+
+def remove(code):
+    _index.pop(code, None)
+    _changed()
+
+
+def is_ready():
+    return _ready
+
+
+def list_movies():
+    """
+    Returns ([(code, title), ...] for every unexpired code, and the earliest
+    future expires_at, after which the list has to be rebuilt).
+    """
+    now = datetime.now()
+    movies = []
+    next_expiry = None
+    for code, entries in _index.items():
+        alive = [(expires_at, video) for expires_at, video in entries if expires_at is None or expires_at > now]
+        if not alive:
+            continue
+        movies.append((code, alive[0][1].title))
+        for expires_at, _ in alive:
+            if expires_at is not None and (next_expiry is None or expires_at < next_expiry):
+                next_expiry = expires_at
+    return movies, next_expiry
+
+
+def get_stats():
+    return {**stats, "codes": len(_index), "ready": _ready}
+
+
+async def notify(conn, code):
+    await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, code)
+
+
+async def notify_reload(conn):
+    await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, RELOAD)
+
+
+async def start_listener(dsn, pool):
+    """Opens a dedicated connection that LISTENs for catalog changes."""
+    global _listener_conn
+
+    def on_notify(connection, pid, channel, payload):
+        if payload == RELOAD:
+            _spawn(load(pool))
+        else:
+            _spawn(refresh_code(pool, payload))
+
+    def on_terminate(connection):
+        global _listener_conn
+        _listener_conn = None
+        if _closing:
+            return
+        logger.warning("⚠️ Katalog LISTEN ulanishi uzildi, qayta ulanilmoqda...")
+        _spawn(_reconnect(dsn, pool))
+
+    conn = await asyncpg.connect(dsn)
+    await conn.add_listener(CHANNEL, on_notify)
+    conn.add_termination_listener(on_terminate)
+    _listener_conn = conn
+    logger.info(f"✅ Katalog LISTEN '{CHANNEL}' ishga tushdi.")
+
+
+async def _reconnect(dsn, pool):
+    delay = 1
+    while True:
+        try:
+            await start_listener(dsn, pool)
+            # Notifications may have been missed while we were disconnected
+            await load(pool)
+            return
+        except Exception as e:
+            logger.error(f"❌ Katalog LISTEN qayta ulanmadi: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+async def start(dsn, pool):
+    """Loads the snapshot and subscribes to changes made by other replicas."""
+    global _closing
+    _closing = False
+    await load(pool)
+    try:
+        await start_listener(dsn, pool)
+    except Exception as e:
+        logger.error(f"❌ Katalog LISTEN ishga tushmadi: {e}")
+        _spawn(_reconnect(dsn, pool))
+
+
+async def stop_listener():
+    global _listener_conn, _closing
+    _closing = True
+    for task in list(_tasks):
+        task.cancel()
+    conn = _listener_conn
+    _listener_conn = None
+    if conn and not conn.is_closed():
+        await conn.close()
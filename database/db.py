@@ -1,10 +1,24 @@
 import os
-import asyncpg
 import asyncio
-from datetime import datetime
+import json
+from datetime import datetime, date
 from dotenv import load_dotenv
 import logging
 
+from database import catalog
+from database.migrate import run_migrations
+from utils.search import normalize as normalize_search
+from database.buffers import LastSeenBuffer, ViewCounter
+from database.profiles import ProfileCache
+from database.models import Video
+from database.pool import create_pool
+from utils import metrics
+from config import (
+    LAST_SEEN_FLUSH_INTERVAL, LAST_SEEN_BUFFER_SIZE, VIEWS_FLUSH_INTERVAL,
+    PROFILE_CACHE_SIZE, PROFILE_CACHE_IDLE_TTL, PROFILE_CACHE_MAX_AGE, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+    DB_POOL_MAX_INACTIVE_LIFETIME, DB_STATEMENT_CACHE_SIZE, DB_COMMAND_TIMEOUT, DB_KEEPALIVE_INTERVAL
+)
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -13,12 +27,19 @@ logger = logging.getLogger(__name__)
 # Global pool variable
 pg_pool = None
 
+last_seen_buffer = LastSeenBuffer(LAST_SEEN_FLUSH_INTERVAL, LAST_SEEN_BUFFER_SIZE)
+view_counter = ViewCounter(VIEWS_FLUSH_INTERVAL)
+profile_cache = ProfileCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_IDLE_TTL, PROFILE_CACHE_MAX_AGE)
+
 async def get_pool():
     global pg_pool
     if pg_pool is None:
         try:
-            pg_pool = await asyncpg.create_pool(DATABASE_URL)
-            logger.info("✅ Database pool created successfully.")
+            pg_pool = await create_pool(
+                DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_MAX_INACTIVE_LIFETIME,
+                DB_STATEMENT_CACHE_SIZE, DB_COMMAND_TIMEOUT
+            )
+            logger.info(f"✅ Database pool created successfully ({DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE}).")
         except Exception as e:
             logger.error(f"❌ Failed to create database pool: {e}")
             raise
@@ -31,70 +52,11 @@ async def init_pg_db():
         
     pool = await get_pool()
     async with pool.acquire() as conn:
-        # Create Tables for Neon (PostgreSQL)
-        logger.info("🛠️ Neon.tech (PostgreSQL) jadvallari yaratilmoqda...")
-        
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                telegram_id BIGINT UNIQUE,
-                username TEXT,
-                language TEXT DEFAULT 'uz',
-                join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                daily_requests INTEGER DEFAULT 0,
-                last_request_date DATE,
-                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS channels (
-                id SERIAL PRIMARY KEY,
-                title TEXT,
-                url TEXT,
-                channel_id TEXT UNIQUE
-            )
-        ''')
-        
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS videos (
-                id SERIAL PRIMARY KEY,
-                code TEXT,
-                title TEXT,
-                quality TEXT,
-                file_id TEXT,
-                file_type TEXT DEFAULT 'video',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                views_count INTEGER DEFAULT 0,
-                expires_at TIMESTAMP,
-                storage_channel_id TEXT,
-                storage_message_id INTEGER
-            )
-        ''')
-        
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS ratings (
-                id SERIAL PRIMARY KEY,
-                video_id INTEGER,
-                user_id BIGINT,
-                rating INTEGER,
-                UNIQUE(video_id, user_id)
-            )
-        ''')
-        # Migration: Ensure user_id is BIGINT if table already exists
-        try:
-            await conn.execute('ALTER TABLE ratings ALTER COLUMN user_id TYPE BIGINT')
-        except Exception:
-            pass
-        
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS broadcast_messages (
-                id SERIAL PRIMARY KEY,
-                broadcast_id TEXT,
-                user_id BIGINT,
-                message_id INTEGER
-            )
-        ''')
+        # Create/upgrade tables for Neon (PostgreSQL), see database/migrations
+        logger.info("🛠️ Neon.tech (PostgreSQL) jadvallari tekshirilmoqda...")
+        applied = await run_migrations(conn)
+        if applied:
+            logger.info(f"🛠️ Bajarilgan migratsiyalar: {applied}")
         
         logger.info("✅ Jadvallar tayyor.")
         
@@ -115,39 +77,82 @@ async def init_pg_db():
 async def add_user(telegram_id, username):
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute('INSERT INTO users (telegram_id, username) VALUES ($1, $2) ON CONFLICT (telegram_id) DO NOTHING', telegram_id, username)
+        inserted = await conn.fetchval('INSERT INTO users (telegram_id, username) VALUES ($1, $2) ON CONFLICT (telegram_id) DO NOTHING RETURNING id', telegram_id, username)
+        if inserted is not None:
+            profile_cache.put(telegram_id, {'language': 'uz', 'daily_requests': 0, 'last_request_date': None})
 
 async def set_user_language(telegram_id, lang):
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute('UPDATE users SET language = $1 WHERE telegram_id = $2', lang, telegram_id)
+    profile_cache.update(telegram_id, language=lang)
 
-async def get_user_language(telegram_id):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT language FROM users WHERE telegram_id = $1', telegram_id)
-        return row['language'] if row else 'uz'
-
-async def get_user_stats(telegram_id):
+async def get_user_profile(telegram_id):
+    """Language and quota fields for a user, served from profile_cache when possible."""
+    profile = profile_cache.get(telegram_id)
+    if profile is not None:
+        return profile
     pool = await get_pool()
     async with pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT daily_requests, last_request_date FROM users WHERE telegram_id = $1', telegram_id)
-        if row:
-            return row['daily_requests'], row['last_request_date']
+        row = await conn.fetchrow('SELECT language, daily_requests, last_request_date FROM users WHERE telegram_id = $1', telegram_id)
+    if not row:
+        # Unknown users are not cached, so add_user can populate them later
         return None
+    profile = dict(row)
+    profile_cache.put(telegram_id, profile)
+    return profile
 
-async def update_user_requests(telegram_id, count, date_obj):
+async def get_user_language(telegram_id):
+    profile = await get_user_profile(telegram_id)
+    return (profile and profile['language']) or 'uz'
+
+async def consume_daily_request(telegram_id, tier_limits, default_limit):
+    """
+    Atomically counts one request against the user's daily quota.
+
+    Resets the counter on a new day, increments it and checks the tier limit in
+    a single statement. Returns True if the request is allowed. Users without
+    a row are allowed (same as before they are registered).
+    """
+    today = date.today()
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute('UPDATE users SET daily_requests = $1, last_request_date = $2 WHERE telegram_id = $3', count, date_obj, telegram_id)
+        row = await conn.fetchrow('''
+            WITH limits AS (
+                SELECT tier, daily_limit FROM UNNEST($3::text[], $4::int[]) AS t(tier, daily_limit)
+            ), upd AS (
+                UPDATE users AS u SET
+                    daily_requests = CASE WHEN u.last_request_date IS DISTINCT FROM $2 THEN 1
+                                          ELSE COALESCE(u.daily_requests, 0) + 1 END,
+                    last_request_date = $2
+                WHERE u.telegram_id = $1
+                  AND (
+                      u.last_request_date IS DISTINCT FROM $2
+                      OR COALESCE((SELECT daily_limit FROM limits WHERE limits.tier = u.tier), $5) <= 0
+                      OR COALESCE(u.daily_requests, 0) < COALESCE((SELECT daily_limit FROM limits WHERE limits.tier = u.tier), $5)
+                  )
+                RETURNING u.daily_requests
+            )
+            SELECT (SELECT daily_requests FROM upd) AS used,
+                   EXISTS (SELECT 1 FROM users WHERE telegram_id = $1) AS known
+        ''', telegram_id, today, list(tier_limits.keys()), list(tier_limits.values()), default_limit)
+    if row['used'] is not None:
+        profile_cache.update(telegram_id, daily_requests=row['used'], last_request_date=today)
+        return True
+    return not row['known']
 
 async def add_video(code, title, quality, file_id, file_type='video', expires_at=None, storage_channel_id=None, storage_message_id=None):
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute('''
-            INSERT INTO videos (code, title, quality, file_id, file_type, expires_at, storage_channel_id, storage_message_id) 
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-        ''', code, title, quality, file_id, file_type, expires_at, storage_channel_id, storage_message_id)
+        video_id = await conn.fetchval('''
+            INSERT INTO videos (code, title, quality, file_id, file_type, expires_at, storage_channel_id, storage_message_id, search_key) 
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            RETURNING id
+        ''', code, title, quality, file_id, file_type, expires_at, storage_channel_id, storage_message_id, normalize_search(title))
+        # Keep the local snapshot current and tell the other replicas
+        catalog.put(Video(video_id, code, title, quality, file_id, file_type, storage_channel_id, storage_message_id, 0, expires_at))
+        await catalog.notify(conn, code)
+        return video_id
 
 async def check_code_exists(code):
     pool = await get_pool()
@@ -155,25 +160,16 @@ async def check_code_exists(code):
         row = await conn.fetchval('SELECT id FROM videos WHERE code = $1 LIMIT 1', code)
         return row is not None
 
-async def get_video_by_code(code):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        now = datetime.now()
-        rows = await conn.fetch('''
-            SELECT title, quality, file_id, views_count, id, file_type, storage_channel_id, storage_message_id FROM videos 
-            WHERE code = $1 AND (expires_at IS NULL OR expires_at > $2)
-        ''', code, now)
-        return [tuple(row) for row in rows]
-
-async def increment_views(video_id):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        await conn.execute('UPDATE videos SET views_count = views_count + 1 WHERE id = $1', video_id)
+def increment_views(video_id):
+    # Counted in memory and added to videos.views_count in bulk by view_counter
+    view_counter.increment(video_id)
 
 async def delete_code(code):
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute('DELETE FROM videos WHERE code = $1', code)
+        catalog.remove(code)
+        await catalog.notify(conn, code)
 
 async def get_all_codes():
     pool = await get_pool()
@@ -181,26 +177,37 @@ async def get_all_codes():
         rows = await conn.fetch('SELECT DISTINCT code, title FROM videos')
         return [tuple(row) for row in rows]
 
-async def search_videos_by_title(query):
+async def search_videos_by_title(query, limit=10, after=None):
+    """
+    Ranked, keyset-paginated title search.
+
+    query must already be normalized with utils.search.normalize. Rows are
+    (code, title, rank, views_count, id); pass the last row's (rank, views_count, id)
+    as `after` to get the next page.
+    """
+    if after is None:
+        after = (None, None, None)
     pool = await get_pool()
     async with pool.acquire() as conn:
         now = datetime.now()
         rows = await conn.fetch('''
-            SELECT DISTINCT code, title FROM videos 
-            WHERE title ILIKE $1 AND (expires_at IS NULL OR expires_at > $2)
-        ''', f'%{query}%', now)
+            SELECT code, title, rank, views_count, id FROM (
+                SELECT code, title, COALESCE(views_count, 0) AS views_count, id,
+                       CASE WHEN search_key LIKE '%' || $1 || '%' THEN 1
+                            ELSE ROUND(word_similarity($1, search_key)::numeric, 4) END AS rank
+                FROM videos
+                WHERE (search_key LIKE '%' || $1 || '%' OR $1 <% search_key)
+                  AND (expires_at IS NULL OR expires_at > $2)
+            ) matches
+            WHERE $3::numeric IS NULL OR (rank, views_count, id) < ($3::numeric, $4::int, $5::int)
+            ORDER BY rank DESC, views_count DESC, id DESC
+            LIMIT $6
+        ''', query, now, after[0], after[1], after[2], limit)
         return [tuple(row) for row in rows]
 
-async def get_video_by_id(video_id):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow('SELECT file_id, quality, title, views_count, file_type, storage_channel_id, storage_message_id FROM videos WHERE id = $1', video_id)
-        return tuple(row) if row else None
-
-async def touch_user(telegram_id):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        await conn.execute('UPDATE users SET last_seen = CURRENT_TIMESTAMP WHERE telegram_id = $1', telegram_id)
+def touch_user(telegram_id):
+    # Buffered in memory and written in bulk by last_seen_buffer
+    last_seen_buffer.touch(telegram_id)
 
 async def get_global_stats():
     pool = await get_pool()
@@ -209,32 +216,113 @@ async def get_global_stats():
         # Active in last 30 days
         active_users = await conn.fetchval("SELECT COUNT(*) FROM users WHERE last_seen > CURRENT_TIMESTAMP - INTERVAL '30 days'")
         total_videos = await conn.fetchval('SELECT COUNT(*) FROM videos')
-        return total_users, active_users, total_videos
+        blocked_users = await conn.fetchval('SELECT COUNT(*) FROM users WHERE blocked_at IS NOT NULL')
+        return total_users, active_users, total_videos, blocked_users
+
+def _rating_summary(rating_sum, rating_count):
+    if rating_count:
+        return round(rating_sum / rating_count, 1), rating_count
+    return 0, 0
 
 async def add_rating(video_id, user_id, rating):
+    """Stores a vote and updates the aggregates on the video row; returns (avg, count)."""
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute('''
-            INSERT INTO ratings (video_id, user_id, rating)
-            VALUES ($1, $2, $3)
-            ON CONFLICT (video_id, user_id) DO UPDATE SET rating = EXCLUDED.rating
-        ''', video_id, user_id, rating)
+        async with conn.transaction():
+            # The video row is updated below anyway; locking it first serializes
+            # votes for the same video so a changed vote is never counted twice
+            video = await conn.fetchrow(
+                'SELECT rating_sum, rating_count, rating_hist FROM videos WHERE id = $1 FOR UPDATE',
+                video_id
+            )
+            old = await conn.fetchval(
+                'SELECT rating FROM ratings WHERE video_id = $1 AND user_id = $2',
+                video_id, user_id
+            )
+            await conn.execute('''
+                INSERT INTO ratings (video_id, user_id, rating)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (video_id, user_id) DO UPDATE SET rating = EXCLUDED.rating
+            ''', video_id, user_id, rating)
+            if video is None:
+                return 0, 0
+
+            rating_sum = video['rating_sum'] or 0
+            rating_count = video['rating_count'] or 0
+            hist = list(video['rating_hist'] or [0] * 5)
+            if old == rating:
+                return _rating_summary(rating_sum, rating_count)
+            if old is None:
+                rating_count += 1
+            else:
+                rating_sum -= old
+                if 1 <= old <= 5:
+                    hist[old - 1] -= 1
+            rating_sum += rating
+            if 1 <= rating <= 5:
+                hist[rating - 1] += 1
+
+            await conn.execute(
+                'UPDATE videos SET rating_sum = $2, rating_count = $3, rating_hist = $4 WHERE id = $1',
+                video_id, rating_sum, rating_count, hist
+            )
+            return _rating_summary(rating_sum, rating_count)
 
 async def get_rating_stats(video_id):
     pool = await get_pool()
     async with pool.acquire() as conn:
-        row = await conn.fetchrow('''
-            SELECT AVG(rating) as avg, COUNT(rating) as count FROM ratings WHERE video_id = $1
-        ''', video_id)
-        if row and row['count'] > 0:
-            return round(float(row['avg']), 1), row['count']
+        row = await conn.fetchrow('SELECT rating_sum, rating_count FROM videos WHERE id = $1', int(video_id))
+        if row:
+            return _rating_summary(row['rating_sum'] or 0, row['rating_count'] or 0)
         return 0, 0
 
-async def get_all_users():
+def _user_filter(language=None, active_days=None, include_blocked=False, first_param=1):
+    """WHERE clauses and arguments shared by iter_user_ids and count_users."""
+    clauses, args = [], []
+    if not include_blocked:
+        clauses.append('blocked_at IS NULL')
+    if language:
+        args.append(language)
+        clauses.append(f'language = ${first_param + len(args) - 1}')
+    if active_days:
+        # Relative to the database clock that last_seen is written with
+        args.append(int(active_days))
+        clauses.append(f'last_seen >= CURRENT_TIMESTAMP - make_interval(days => ${first_param + len(args) - 1})')
+    return clauses, args
+
+async def count_users(language=None, active_days=None, include_blocked=False):
+    clauses, args = _user_filter(language, active_days, include_blocked)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
     pool = await get_pool()
     async with pool.acquire() as conn:
-        rows = await conn.fetch('SELECT telegram_id FROM users')
-        return [row['telegram_id'] for row in rows]
+        return await conn.fetchval(f'SELECT COUNT(*) FROM users {where}', *args)
+
+async def iter_user_ids(chunk_size=1000, after=0, language=None, active_days=None, include_blocked=False):
+    """
+    Yields lists of up to chunk_size telegram_ids in ascending order, starting
+    after `after`.
+
+    Each chunk is one keyset query (telegram_id > last id), so memory stays flat
+    and no connection is held between chunks, however many users there are.
+    Users who blocked the bot are skipped unless include_blocked is set.
+    """
+    clauses, args = _user_filter(language, active_days, include_blocked, first_param=3)
+    query = f'''
+        SELECT telegram_id FROM users
+        WHERE {' AND '.join(['telegram_id > $1'] + clauses)}
+        ORDER BY telegram_id LIMIT $2
+    '''
+    pool = await get_pool()
+    while True:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(query, after, chunk_size, *args)
+        if not rows:
+            return
+        chunk = [row['telegram_id'] for row in rows]
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1]
 
 async def get_all_channels():
     pool = await get_pool()
@@ -257,26 +345,224 @@ async def update_channel_title(db_id, new_title):
     async with pool.acquire() as conn:
         await conn.execute('UPDATE channels SET title = $1 WHERE id = $2', new_title, db_id)
 
-async def save_broadcast_message(broadcast_id, user_id, message_id):
+async def ensure_broadcast_partition(broadcast_id):
+    """Creates the broadcast_messages partition of a broadcast if it does not exist yet."""
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute('INSERT INTO broadcast_messages (broadcast_id, user_id, message_id) VALUES ($1, $2, $3)', broadcast_id, int(user_id), message_id)
+        async with conn.transaction():
+            partition_id = await conn.fetchval(
+                'INSERT INTO broadcast_partitions (broadcast_id) VALUES ($1) ON CONFLICT (broadcast_id) DO NOTHING RETURNING id',
+                broadcast_id
+            )
+            if partition_id is not None:
+                # DDL takes no bind parameters; the table name is our id and the value is quoted
+                literal = broadcast_id.replace("'", "''")
+                await conn.execute(
+                    f"CREATE TABLE broadcast_messages_p{partition_id} PARTITION OF broadcast_messages FOR VALUES IN ('{literal}')"
+                )
+
+async def create_broadcast_job(broadcast_id, from_chat_id, message_id, admin_chat_id, status_message_id, target=None, total=0, owner=None, lease_ttl=60):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow('''
+            INSERT INTO broadcast_jobs (broadcast_id, from_chat_id, message_id, admin_chat_id, status_message_id, target, total, owner, lease_until)
+            VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7, $8, CURRENT_TIMESTAMP + make_interval(secs => $9))
+            RETURNING *
+        ''', broadcast_id, from_chat_id, message_id, admin_chat_id, status_message_id, json.dumps(target or {}), total, owner, float(lease_ttl))
+        return dict(row)
 
-async def get_broadcast_messages(broadcast_id):
+async def get_broadcast_job(broadcast_id):
     pool = await get_pool()
     async with pool.acquire() as conn:
-        rows = await conn.fetch('SELECT user_id, message_id FROM broadcast_messages WHERE broadcast_id = $1', broadcast_id)
-        return [tuple(row) for row in rows]
+        row = await conn.fetchrow('SELECT * FROM broadcast_jobs WHERE broadcast_id = $1', broadcast_id)
+        return dict(row) if row else None
+
+async def claim_broadcast_jobs(owner, lease_ttl, broadcast_id=None):
+    """
+    Takes the lease on running jobs that nobody holds (or whose owner stopped
+    renewing it); returns the claimed rows. With broadcast_id only that job is tried.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch('''
+            UPDATE broadcast_jobs
+            SET owner = $1, lease_until = CURRENT_TIMESTAMP + make_interval(secs => $2)
+            WHERE status = 'running'
+              AND ($3::text IS NULL OR broadcast_id = $3)
+              AND (owner IS NULL OR owner = $1 OR lease_until < CURRENT_TIMESTAMP)
+            RETURNING *
+        ''', owner, float(lease_ttl), broadcast_id)
+        return [dict(row) for row in sorted(rows, key=lambda r: r['id'])]
+
+async def renew_broadcast_lease(broadcast_id, owner, lease_ttl):
+    """Extends the lease; returns the stored status, or None when the lease was lost."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval('''
+            UPDATE broadcast_jobs SET lease_until = CURRENT_TIMESTAMP + make_interval(secs => $3)
+            WHERE broadcast_id = $1 AND owner = $2
+            RETURNING status
+        ''', broadcast_id, owner, float(lease_ttl))
+
+async def release_broadcast_jobs(owner, broadcast_id=None):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute('''
+            UPDATE broadcast_jobs SET owner = NULL, lease_until = NULL
+            WHERE owner = $1 AND ($2::text IS NULL OR broadcast_id = $2)
+        ''', owner, broadcast_id)
+
+async def set_broadcast_job_status(broadcast_id, status, owner=None):
+    """
+    Stores a job status. With `owner` (the runner finishing the job) the write
+    only happens while it still holds the lease, and the lease is released.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        if owner is None:
+            await conn.execute(
+                'UPDATE broadcast_jobs SET status = $1, updated_at = CURRENT_TIMESTAMP WHERE broadcast_id = $2',
+                status, broadcast_id
+            )
+        else:
+            await conn.execute('''
+                UPDATE broadcast_jobs
+                SET status = $1, owner = NULL, lease_until = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE broadcast_id = $2 AND owner = $3
+            ''', status, broadcast_id, owner)
+
+async def save_broadcast_checkpoint(broadcast_id, records, cursor, sent, blocked, failed, blocked_ids=(), owner=None, lease_ttl=60):
+    """
+    Stores sent message ids, blocked users and the new cursor in one
+    transaction, so a resumed job never re-sends to users whose messages were
+    already recorded. Also renews the lease. Returns the stored status (which
+    another instance may have set to paused/cancelled), or None when `owner`
+    no longer holds the lease and must stop.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # Recorded even without the lease: the messages were sent and can still be recalled
+            if records:
+                await conn.copy_records_to_table(
+                    'broadcast_messages',
+                    records=records,
+                    columns=['broadcast_id', 'user_id', 'message_id']
+                )
+            if blocked_ids:
+                await conn.execute(
+                    # Database clock, like last_seen, which it is compared with
+                    'UPDATE users SET blocked_at = CURRENT_TIMESTAMP WHERE telegram_id = ANY($1::bigint[]) AND blocked_at IS NULL',
+                    list(blocked_ids)
+                )
+            return await conn.fetchval('''
+                UPDATE broadcast_jobs
+                SET cursor = $2, sent = $3, blocked = $4, failed = $5, updated_at = CURRENT_TIMESTAMP,
+                    lease_until = CURRENT_TIMESTAMP + make_interval(secs => $7)
+                WHERE broadcast_id = $1 AND owner IS NOT DISTINCT FROM $6
+                RETURNING status
+            ''', broadcast_id, cursor, sent, blocked, failed, owner, float(lease_ttl))
+
+async def count_broadcast_messages(broadcast_id):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval('SELECT COUNT(*) FROM broadcast_messages WHERE broadcast_id = $1', broadcast_id)
+
+async def get_broadcast_messages(broadcast_id, chunk_size=1000):
+    """
+    Yields (user_id, message_id) of a broadcast, chunk by chunk in user_id order.
+
+    Each chunk is its own short query, so no connection or transaction is held
+    while the caller works through the messages (deleting them takes hours).
+    """
+    pool = await get_pool()
+    last_user_id = 0
+    while True:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT user_id, message_id FROM broadcast_messages
+                WHERE broadcast_id = $1 AND user_id > $2
+                ORDER BY user_id LIMIT $3
+            ''', broadcast_id, last_user_id, chunk_size)
+        for row in rows:
+            yield row['user_id'], row['message_id']
+        if len(rows) < chunk_size:
+            return
+        last_user_id = rows[-1]['user_id']
+
+async def mark_broadcast_recalled(broadcast_id):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            'UPDATE broadcast_partitions SET recalled_at = CURRENT_TIMESTAMP WHERE broadcast_id = $1', broadcast_id
+        )
+
+async def drop_expired_broadcast_partitions(delete_window):
+    """
+    Drops the broadcast_messages partitions that are no longer useful: recalled
+    broadcasts, and broadcasts whose last message left the deletable window.
+    Running jobs are skipped; a resumed job recreates its partition.
+    Returns the dropped broadcast ids.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch('''
+            SELECT p.id, p.broadcast_id FROM broadcast_partitions p
+            LEFT JOIN broadcast_jobs j ON j.broadcast_id = p.broadcast_id
+            WHERE (j.status IS NULL OR j.status <> 'running')
+              AND (p.recalled_at IS NOT NULL
+                   OR GREATEST(p.created_at, j.updated_at) < CURRENT_TIMESTAMP - make_interval(secs => $1))
+        ''', float(delete_window))
+        for row in rows:
+            async with conn.transaction():
+                await conn.execute(f"DROP TABLE IF EXISTS broadcast_messages_p{row['id']}")
+                await conn.execute('DELETE FROM broadcast_partitions WHERE id = $1', row['id'])
+    return [row['broadcast_id'] for row in rows]
+
+async def get_media_file_ids():
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch('SELECT name, checksum, file_id FROM media_files')
+        return {row['name']: (row['checksum'], row['file_id']) for row in rows}
+
+async def save_media_file_id(name, checksum, file_id):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute('''
+            INSERT INTO media_files (name, checksum, file_id) VALUES ($1, $2, $3)
+            ON CONFLICT (name) DO UPDATE SET checksum = EXCLUDED.checksum, file_id = EXCLUDED.file_id, updated_at = CURRENT_TIMESTAMP
+        ''', name, checksum, file_id)
 
 async def init_db():
     await init_pg_db()
+    if not DATABASE_URL:
+        return
+    pool = await get_pool()
+    # Open min_size connections now, so the first user request does not pay for it
+    warmed_in = await pool.warm()
+    logger.info(f"🔥 Pool isitildi: {warmed_in:.2f}s")
+    pool.start_keepalive(DB_KEEPALIVE_INTERVAL)
+    last_seen_buffer.start(pool)
+    view_counter.start(pool)
+    try:
+        await catalog.start(DATABASE_URL, pool)
+    except Exception as e:
+        # Lookups fall back to the database until the snapshot is available
+        logger.error(f"❌ Katalog keshini yuklab bo'lmadi: {e}")
 
 async def close_db():
     global pg_pool
+    await catalog.stop_listener()
+    await last_seen_buffer.stop()
+    await view_counter.stop()
     if pg_pool:
         await pg_pool.close()
+        pg_pool = None
         logger.info("✅ Database pool closed.")
 
+# Latency/error metrics for every query function above
+metrics.instrument_module(globals(), exclude=("get_pool", "init_pg_db", "init_db", "close_db"))
+
 if __name__ == "__main__":
     asyncio.run(init_db())
 
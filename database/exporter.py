@@ -0,0 +1,93 @@
+"""
+Streaming table export (backups, seeding a staging database).
+
+Rows come straight from Postgres with COPY ... TO STDOUT and are gzip
+compressed chunk by chunk, so memory use does not depend on table size.
+
+    python -m database.exporter videos -o videos.csv.gz
+    python -m database.exporter ratings --format jsonl -o ratings.jsonl.gz
+"""
+import argparse
+import asyncio
+import logging
+import zlib
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+TABLES = {
+    "videos": '''
+        SELECT id, code, title, quality, file_id, file_type, storage_channel_id, storage_message_id,
+               views_count, expires_at, created_at, rating_sum, rating_count
+        FROM videos ORDER BY id
+    ''',
+    "ratings": "SELECT id, video_id, user_id, rating FROM ratings ORDER BY id",
+    "channels": "SELECT id, title, url, channel_id FROM channels ORDER BY id",
+}
+FORMATS = ("csv", "jsonl")
+
+
+class GzipStream:
+    """Feeds COPY output through gzip and passes the compressed chunks to `write`."""
+
+    def __init__(self, write, level=6):
+        self._write = write
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self.raw_bytes = 0
+
+    async def __call__(self, chunk):
+        self.raw_bytes += len(chunk)
+        data = self._compressor.compress(chunk)
+        if data:
+            await self._write(data)
+
+    async def close(self):
+        await self._write(self._compressor.flush())
+
+
+async def copy_table(conn, table, fmt, output):
+    """Streams one table from TABLES in `fmt` to the async callable `output`."""
+    query = TABLES[table]
+    if fmt == "jsonl":
+        # One JSON object per line. JSON escapes control characters, so with these
+        # quote/delimiter bytes CSV mode passes every line through untouched.
+        await conn.copy_from_query(
+            f"SELECT row_to_json(t) FROM ({query}) t",
+            output=output, format="csv", quote="\x01", delimiter="\x02"
+        )
+    else:
+        await conn.copy_from_query(query, output=output, format="csv", header=True)
+
+
+def filename(table, fmt):
+    return f"{table}.{fmt}.gz"
+
+
+async def main():
+    from database.db import DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="Export a table as gzip-compressed CSV or JSONL.")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("-o", "--output", help="defaults to <table>.<format>.gz")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    path = args.output or filename(args.table, args.format)
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        with open(path, "wb") as f:
+            async def write(data):
+                f.write(data)
+
+            stream = GzipStream(write)
+            await copy_table(conn, args.table, args.format, stream)
+            await stream.close()
+    finally:
+        await conn.close()
+    logger.info(f"✅ {args.table} → {path} ({stream.raw_bytes} bayt siqilmagan)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
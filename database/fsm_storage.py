@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+def _key(key: StorageKey) -> str:
+    parts = [key.bot_id, key.chat_id, key.user_id, key.thread_id, getattr(key, "business_connection_id", None), key.destiny]
+    return ":".join("" if part is None else str(part) for part in parts)
+
+
+class PostgresStorage(BaseStorage):
+    """
+    aiogram FSM storage in the fsm_storage table, sharing the asyncpg pool.
+
+    Every write is a single statement that bumps the row version. An entry
+    without state and data (what FSMContext.clear() leaves) is not stored: the
+    row is deleted, and a write that would not change an already empty cached
+    entry is skipped, so clearing on every request costs nothing. Reads are served
+    from a small in-process cache for `cache_ttl` seconds; after that the entry
+    is revalidated with a query that only returns the payload if the version
+    changed (e.g. on another replica). Rows untouched for `state_ttl` seconds
+    are removed by a background task.
+    """
+
+    def __init__(self, pool, cache_size=10000, cache_ttl=2.0, state_ttl=7 * 86400, cleanup_interval=3600):
+        self.pool = pool
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.state_ttl = state_ttl
+        self.cleanup_interval = cleanup_interval
+        self._cache = OrderedDict()  # key -> [checked_at, version, state, data]
+        self._cleanup_task = None
+
+    def start(self):
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    def _remember(self, key, version, state, data):
+        self._cache[key] = [time.monotonic(), version, state, data]
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _read(self, key: StorageKey):
+        k = _key(key)
+        entry = self._cache.get(k)
+        if entry and time.monotonic() - entry[0] < self.cache_ttl:
+            return entry[2], entry[3]
+
+        async with self.pool.acquire() as conn:
+            if entry:
+                row = await conn.fetchrow('''
+                    SELECT version,
+                           CASE WHEN version = $2 THEN NULL ELSE state END AS state,
+                           CASE WHEN version = $2 THEN NULL ELSE data END AS data
+                    FROM fsm_storage WHERE key = $1
+                ''', k, entry[1])
+            else:
+                row = await conn.fetchrow('SELECT version, state, data FROM fsm_storage WHERE key = $1', k)
+
+        if row is None:
+            self._remember(k, 0, None, {})
+        elif entry and row['version'] == entry[1]:
+            entry[0] = time.monotonic()
+            self._cache.move_to_end(k)
+        else:
+            self._remember(k, row['version'], row['state'], json.loads(row['data']) if row['data'] else {})
+        cached = self._cache[k]
+        return cached[2], cached[3]
+
+    def _is_cleared(self, k):
+        # Fresh cache entry that is already (None, {}): reads would return the same
+        entry = self._cache.get(k)
+        return bool(entry) and time.monotonic() - entry[0] < self.cache_ttl and entry[2] is None and not entry[3]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        k = _key(key)
+        if state is None and self._is_cleared(k):
+            return
+        async with self.pool.acquire() as conn:
+            if state is None:
+                # Deleted when no data is left, otherwise only the state is dropped
+                row = await conn.fetchrow('''
+                    WITH deleted AS (
+                        DELETE FROM fsm_storage WHERE key = $1 AND data = '{}'::jsonb RETURNING key
+                    )
+                    UPDATE fsm_storage
+                    SET state = NULL, version = nextval('fsm_storage_version_seq'), updated_at = CURRENT_TIMESTAMP
+                    WHERE key = $1 AND NOT EXISTS (SELECT 1 FROM deleted)
+                    RETURNING version, data
+                ''', k)
+            else:
+                row = await conn.fetchrow('''
+                    INSERT INTO fsm_storage (key, state) VALUES ($1, $2)
+                    ON CONFLICT (key) DO UPDATE
+                    SET state = EXCLUDED.state, version = nextval('fsm_storage_version_seq'), updated_at = CURRENT_TIMESTAMP
+                    RETURNING version, data
+                ''', k, state)
+        if row is None:
+            self._remember(k, 0, None, {})
+        else:
+            self._remember(k, row['version'], state, json.loads(row['data']) if row['data'] else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = _key(key)
+        if not data and self._is_cleared(k):
+            return
+        async with self.pool.acquire() as conn:
+            if not data:
+                # Deleted when no state is left, otherwise only the data is emptied
+                row = await conn.fetchrow('''
+                    WITH deleted AS (
+                        DELETE FROM fsm_storage WHERE key = $1 AND state IS NULL RETURNING key
+                    )
+                    UPDATE fsm_storage
+                    SET data = '{}'::jsonb, version = nextval('fsm_storage_version_seq'), updated_at = CURRENT_TIMESTAMP
+                    WHERE key = $1 AND NOT EXISTS (SELECT 1 FROM deleted)
+                    RETURNING version, state
+                ''', k)
+            else:
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                row = await conn.fetchrow('''
+                    INSERT INTO fsm_storage (key, data) VALUES ($1, $2::jsonb)
+                    ON CONFLICT (key) DO UPDATE
+                    SET data = EXCLUDED.data, version = nextval('fsm_storage_version_seq'), updated_at = CURRENT_TIMESTAMP
+                    RETURNING version, state
+                ''', k, payload)
+        if row is None:
+            self._remember(k, 0, None, {})
+        else:
+            self._remember(k, row['version'], row['state'], dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._read(key)
+        return dict(data)
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                async with self.pool.acquire() as conn:
+                    result = await conn.execute(
+                        "DELETE FROM fsm_storage WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => $1)",
+                        float(self.state_ttl)
+                    )
+                logger.info(f"🧹 FSM tozalash: {result}")
+            except Exception as e:
+                logger.error(f"❌ FSM holatlarini tozalab bo'lmadi: {e}")
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+        self._cache.clear()
@@ -0,0 +1,303 @@
+"""
+Bulk catalog import from CSV or JSONL.
+
+Each row has the columns code, title, storage_channel_id, storage_message_id,
+file_id, file_type and expires_at (ISO 8601, optional). Rows are validated
+and deduplicated as they are read, copied into a temporary staging table with
+COPY in batches of BATCH_SIZE and merged into videos in one transaction, so
+neither the upload nor the parsed rows are held in memory at once. Codes that already exist in the
+database are reported as conflicts and skipped, like the one-by-one flows do.
+
+    python -m database.importer movies.csv
+    python -m database.importer movies.jsonl --dry-run
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+from collections import deque
+from datetime import datetime
+
+import asyncpg
+
+from database import catalog
+from utils.search import normalize as normalize_search
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("code", "title", "storage_channel_id", "storage_message_id", "file_id", "file_type", "expires_at")
+FILE_TYPES = ("video", "document", "animation")
+DEFAULT_QUALITY = "HD"
+# Staged rows per COPY
+BATCH_SIZE = 5000
+
+_STAGING_COLUMNS = [
+    "line", "code", "title", "quality", "file_id", "file_type",
+    "storage_channel_id", "storage_message_id", "expires_at", "search_key"
+]
+
+
+def detect_format(name=None, content_type=None):
+    if content_type and ("ndjson" in content_type or "jsonl" in content_type):
+        return "jsonl"
+    if name and name.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def read_records(lines, fmt):
+    """Yields (line number, dict) for every row; unparsable rows yield (line number, error text)."""
+    if fmt == "jsonl":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, f"invalid JSON: {e}"
+                continue
+            yield number, record if isinstance(record, dict) else "expected a JSON object"
+    else:
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+
+
+class ImportTooLarge(Exception):
+    """Raised by a line source when the upload exceeds its size limit."""
+
+
+class _LineFeed:
+    """Iterator over a deque, so one csv.reader can be fed as lines arrive."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def aread_records(lines, fmt):
+    """read_records for an async iterable of lines (e.g. a request body), parsed as they arrive."""
+    number = 0
+    if fmt == "jsonl":
+        async for line in lines:
+            number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, f"invalid JSON: {e}"
+                continue
+            yield number, record if isinstance(record, dict) else "expected a JSON object"
+        return
+
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    pending = []
+    async for line in lines:
+        number += 1
+        pending.append(line)
+        # A quoted field may span lines: wait until the quotes are balanced
+        text = "".join(pending)
+        if text.count('"') % 2:
+            continue
+        pending = []
+        feed.lines.append(text)
+        row = next(reader, None)
+        if not row:
+            continue
+        if header is None:
+            header = row
+            continue
+        yield number, dict(zip(header, row))
+    if pending and header is not None:
+        feed.lines.append("".join(pending))
+        row = next(reader, None)
+        if row:
+            yield number, dict(zip(header, row))
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate(record):
+    """Returns the staging row (without line number) for a record or raises ValueError."""
+    code = _text(record, "code")
+    if not code or not code.isdigit():
+        raise ValueError("code must be a number")
+    title = _text(record, "title")
+    if not title:
+        raise ValueError("title is required")
+
+    file_id = _text(record, "file_id")
+    storage_channel_id = _text(record, "storage_channel_id")
+    storage_message_id = _text(record, "storage_message_id")
+    if storage_message_id is not None:
+        try:
+            storage_message_id = int(storage_message_id)
+        except ValueError:
+            raise ValueError("storage_message_id must be an integer")
+    if not file_id and not (storage_channel_id and storage_message_id):
+        raise ValueError("file_id or storage_channel_id + storage_message_id is required")
+
+    file_type = _text(record, "file_type") or "video"
+    if file_type not in FILE_TYPES:
+        raise ValueError(f"file_type must be one of {', '.join(FILE_TYPES)}")
+
+    expires_at = _text(record, "expires_at")
+    if expires_at is not None:
+        try:
+            expires_at = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError("expires_at must be an ISO 8601 date/time")
+        if expires_at.tzinfo is not None:
+            # videos.expires_at is local time without a zone, like datetime.now()
+            expires_at = expires_at.astimezone().replace(tzinfo=None)
+
+    return (
+        code, title, DEFAULT_QUALITY, file_id, file_type,
+        storage_channel_id, storage_message_id, expires_at, normalize_search(title)
+    )
+
+
+def prepare_row(line, record, report, seen):
+    """Validates one (line, record) pair into a staging row; returns None if it is reported instead."""
+    report["rows"] += 1
+    if isinstance(record, str):
+        report["errors"].append({"line": line, "error": record})
+        return None
+    try:
+        row = validate(record)
+    except ValueError as e:
+        report["errors"].append({"line": line, "error": str(e)})
+        return None
+    # Same code and same source file/post twice in the upload
+    key = (row[0], row[3], row[5], row[6])
+    if key in seen:
+        report["duplicates"].append(line)
+        return None
+    seen.add(key)
+    return (line,) + row
+
+
+async def _stage(conn, records, report, batch_size):
+    seen = set()
+    batch = []
+    async for line, record in records:
+        row = prepare_row(line, record, report, seen)
+        if row is None:
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await conn.copy_records_to_table("videos_import", records=batch, columns=_STAGING_COLUMNS)
+            batch = []
+    if batch:
+        await conn.copy_records_to_table("videos_import", records=batch, columns=_STAGING_COLUMNS)
+
+
+async def import_records(conn, records, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Stages an async iterable of (line, record) pairs with COPY batch by batch
+    and inserts those whose code is new, in one transaction. Returns the report.
+    """
+    report = {"rows": 0, "inserted": 0, "duplicates": [], "conflicts": [], "errors": []}
+    tr = conn.transaction()
+    await tr.start()
+    try:
+        await conn.execute('''
+            CREATE TEMP TABLE videos_import (
+                line INTEGER, code TEXT, title TEXT, quality TEXT, file_id TEXT, file_type TEXT,
+                storage_channel_id TEXT, storage_message_id INTEGER, expires_at TIMESTAMP, search_key TEXT
+            ) ON COMMIT DROP
+        ''')
+        await _stage(conn, records, report, batch_size)
+        # Taken only once the upload is staged, so a slow client does not hold off
+        # concurrent single inserts while conflicts are checked and rows merged
+        await conn.execute("LOCK TABLE videos IN SHARE ROW EXCLUSIVE MODE")
+        conflicts = await conn.fetch('''
+            SELECT s.line, s.code FROM videos_import s
+            WHERE EXISTS (SELECT 1 FROM videos v WHERE v.code = s.code)
+            ORDER BY s.line
+        ''')
+        report["conflicts"] = [{"line": r["line"], "code": r["code"]} for r in conflicts]
+        result = await conn.execute('''
+            INSERT INTO videos (code, title, quality, file_id, file_type, storage_channel_id, storage_message_id, expires_at, search_key)
+            SELECT code, title, quality, file_id, file_type, storage_channel_id, storage_message_id, expires_at, search_key
+            FROM videos_import s
+            WHERE NOT EXISTS (SELECT 1 FROM videos v WHERE v.code = s.code)
+            ORDER BY line
+        ''')
+        report["inserted"] = int(result.split()[-1])
+    except BaseException:
+        await tr.rollback()
+        raise
+    if dry_run:
+        await tr.rollback()
+        return report
+    await tr.commit()
+    if report["inserted"]:
+        # One full reload on every replica instead of thousands of per-code refreshes
+        await catalog.notify_reload(conn)
+    return report
+
+
+async def import_lines(conn, lines, fmt, dry_run=False):
+    if hasattr(lines, "__aiter__"):
+        records = aread_records(lines, fmt)
+    else:
+        records = _aiter(read_records(lines, fmt))
+    return await import_records(conn, records, dry_run=dry_run)
+
+
+async def main():
+    from database.db import DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="Bulk import movies from CSV or JSONL.")
+    parser.add_argument("path", help="CSV (with a header row) or JSONL file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="validate and report without saving")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    fmt = args.format or detect_format(args.path)
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as f:
+            report = await import_lines(conn, f, fmt, dry_run=args.dry_run)
+    finally:
+        await conn.close()
+
+    for conflict in report["conflicts"]:
+        print(f"line {conflict['line']}: code {conflict['code']} already exists")
+    for error in report["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    for line in report["duplicates"]:
+        print(f"line {line}: duplicate row")
+    logger.info(
+        f"{'(dry run) ' if args.dry_run else ''}✅ {report['inserted']} / {report['rows']} ta kino qo'shildi, "
+        f"{len(report['conflicts'])} ta mavjud kod, {len(report['errors'])} ta xato, "
+        f"{len(report['duplicates'])} ta takror."
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
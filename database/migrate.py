@@ -0,0 +1,125 @@
+"""
+Versioned schema migrations.
+
+Migrations live in database/migrations as NNNN_name.sql or NNNN_name.py files
+and are applied once, in order, each inside its own transaction. Applied
+versions are recorded in the schema_version table.
+
+A .py migration defines `async def upgrade(conn)` and a `DDL` string that is
+shown by --dry-run.
+
+    python -m database.migrate            # apply pending migrations
+    python -m database.migrate --dry-run  # print the pending DDL only
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import re
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+# Arbitrary key so only one replica migrates at a time
+_LOCK_ID = 727001
+
+
+def list_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _FILENAME.match(filename)
+        if match:
+            version, name, kind = match.groups()
+            migrations.append((int(version), name, os.path.join(MIGRATIONS_DIR, filename), kind))
+    return migrations
+
+
+def _load_module(path):
+    spec = importlib.util.spec_from_file_location(f"migration_{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def describe(path, kind):
+    if kind == "sql":
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    module = _load_module(path)
+    return f"{module.DDL.strip()}\n-- + Python data step: {os.path.basename(path)} upgrade()"
+
+
+async def get_applied_versions(conn):
+    exists = await conn.fetchval("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not exists:
+        return set()
+    rows = await conn.fetch("SELECT version FROM schema_version")
+    return {row['version'] for row in rows}
+
+
+async def run_migrations(conn, dry_run=False):
+    """Applies every pending migration; returns the list of applied versions."""
+    if dry_run:
+        applied = await get_applied_versions(conn)
+        pending = [m for m in list_migrations() if m[0] not in applied]
+        for version, name, path, kind in pending:
+            print(f"-- {version:04d}_{name}\n{describe(path, kind).strip()}\n")
+        if not pending:
+            print("-- Schema is up to date.")
+        return [m[0] for m in pending]
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    await conn.execute("SELECT pg_advisory_lock($1)", _LOCK_ID)
+    try:
+        applied = await get_applied_versions(conn)
+        done = []
+        for version, name, path, kind in list_migrations():
+            if version in applied:
+                continue
+            logger.info(f"🛠️ Migratsiya {version:04d}_{name} bajarilmoqda...")
+            async with conn.transaction():
+                if kind == "sql":
+                    with open(path, encoding="utf-8") as f:
+                        await conn.execute(f.read())
+                else:
+                    await _load_module(path).upgrade(conn)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES ($1, $2)",
+                    version, name
+                )
+            done.append(version)
+        return done
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", _LOCK_ID)
+
+
+async def main():
+    from database.db import DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument("--dry-run", action="store_true", help="print pending DDL without applying it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        applied = await run_migrations(conn, dry_run=args.dry_run)
+        if not args.dry_run:
+            logger.info(f"✅ {len(applied)} ta migratsiya bajarildi.")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
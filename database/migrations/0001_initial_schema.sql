@@ -0,0 +1,47 @@
+-- Tables as they were created by init_pg_db before versioned migrations
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    telegram_id BIGINT UNIQUE,
+    username TEXT,
+    language TEXT DEFAULT 'uz',
+    join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    daily_requests INTEGER DEFAULT 0,
+    last_request_date DATE,
+    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS channels (
+    id SERIAL PRIMARY KEY,
+    title TEXT,
+    url TEXT,
+    channel_id TEXT UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS videos (
+    id SERIAL PRIMARY KEY,
+    code TEXT,
+    title TEXT,
+    quality TEXT,
+    file_id TEXT,
+    file_type TEXT DEFAULT 'video',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    views_count INTEGER DEFAULT 0,
+    expires_at TIMESTAMP,
+    storage_channel_id TEXT,
+    storage_message_id INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    id SERIAL PRIMARY KEY,
+    video_id INTEGER,
+    user_id BIGINT,
+    rating INTEGER,
+    UNIQUE(video_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_messages (
+    id SERIAL PRIMARY KEY,
+    broadcast_id TEXT,
+    user_id BIGINT,
+    message_id INTEGER
+);
@@ -0,0 +1,2 @@
+-- Old databases were created with an INTEGER user_id, too small for Telegram ids
+ALTER TABLE ratings ALTER COLUMN user_id TYPE BIGINT;
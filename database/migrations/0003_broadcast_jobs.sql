@@ -0,0 +1,17 @@
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id SERIAL PRIMARY KEY,
+    broadcast_id TEXT UNIQUE,
+    from_chat_id BIGINT,
+    message_id INTEGER,
+    admin_chat_id BIGINT,
+    status_message_id INTEGER,
+    target JSONB DEFAULT '{}'::jsonb,
+    cursor BIGINT DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    sent INTEGER DEFAULT 0,
+    blocked INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'running',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,23 @@
+-- Rating aggregates kept on the video row (maintained by add_rating)
+ALTER TABLE videos
+    ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_hist INTEGER[] NOT NULL DEFAULT '{0,0,0,0,0}';
+
+-- One-time backfill from the existing votes
+UPDATE videos AS v
+SET rating_sum = a.rating_sum,
+    rating_count = a.rating_count,
+    rating_hist = ARRAY[a.h1, a.h2, a.h3, a.h4, a.h5]
+FROM (
+    SELECT video_id,
+           SUM(rating) AS rating_sum,
+           COUNT(rating) AS rating_count,
+           COUNT(*) FILTER (WHERE rating = 1) AS h1,
+           COUNT(*) FILTER (WHERE rating = 2) AS h2,
+           COUNT(*) FILTER (WHERE rating = 3) AS h3,
+           COUNT(*) FILTER (WHERE rating = 4) AS h4,
+           COUNT(*) FILTER (WHERE rating = 5) AS h5
+    FROM ratings GROUP BY video_id
+) AS a
+WHERE v.id = a.video_id;
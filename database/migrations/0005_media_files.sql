@@ -0,0 +1,7 @@
+-- Telegram file_ids of uploaded static assets (see utils/media.py)
+CREATE TABLE IF NOT EXISTS media_files (
+    name TEXT PRIMARY KEY,
+    checksum TEXT,
+    file_id TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,19 @@
+"""Normalized, Latin/Cyrillic agnostic title search key with a trigram index."""
+from utils.search import normalize
+
+DDL = """
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS search_key TEXT;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_videos_search_key ON videos USING gin (search_key gin_trgm_ops);
+"""
+
+
+async def upgrade(conn):
+    await conn.execute(DDL)
+    # The transliteration lives in Python, so the backfill is done from here
+    rows = await conn.fetch('SELECT id, title FROM videos WHERE search_key IS NULL')
+    if rows:
+        await conn.executemany(
+            'UPDATE videos SET search_key = $2 WHERE id = $1',
+            [(row['id'], normalize(row['title'])) for row in rows]
+        )
@@ -0,0 +1,12 @@
+-- Indexes for the hot lookups
+CREATE INDEX IF NOT EXISTS idx_videos_code ON videos (code);
+
+-- Only videos with an expiry date are ever filtered or swept by it
+CREATE INDEX IF NOT EXISTS idx_videos_expires_at ON videos (expires_at) WHERE expires_at IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users (last_seen);
+
+-- ratings(video_id) lookups are already served by the UNIQUE (video_id, user_id)
+-- index, whose leading column is video_id, so no separate index is added here.
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_messages_broadcast_id ON broadcast_messages (broadcast_id);
@@ -0,0 +1,2 @@
+-- Quota tier per user; limits per tier come from QUOTA_TIERS in config.py
+ALTER TABLE users ADD COLUMN IF NOT EXISTS tier TEXT NOT NULL DEFAULT 'free';
@@ -0,0 +1,56 @@
+"""broadcast_messages partitioned by broadcast, so a whole broadcast is dropped at once."""
+
+DDL = """
+ALTER TABLE broadcast_messages RENAME TO broadcast_messages_legacy;
+
+CREATE TABLE broadcast_messages (
+    broadcast_id TEXT NOT NULL,
+    user_id BIGINT,
+    message_id INTEGER
+) PARTITION BY LIST (broadcast_id);
+CREATE INDEX IF NOT EXISTS idx_broadcast_messages_user_id ON broadcast_messages (user_id);
+
+-- One row per partition (broadcast_messages_p<id>), removed when the partition is dropped
+CREATE TABLE IF NOT EXISTS broadcast_partitions (
+    id SERIAL PRIMARY KEY,
+    broadcast_id TEXT UNIQUE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    recalled_at TIMESTAMP
+);
+
+-- Rows of broadcasts that can still be recalled are moved into per-broadcast
+-- partitions, then the old table is dropped
+"""
+
+# Broadcast ids are brd_<unix time of the send>
+_RECENT = """
+    SELECT m.broadcast_id, to_timestamp(substr(m.broadcast_id, 5)::bigint)::timestamp AS sent_at
+    FROM (SELECT DISTINCT broadcast_id FROM broadcast_messages_legacy WHERE broadcast_id ~ '^brd_[0-9]+$') m
+    LEFT JOIN broadcast_jobs j ON j.broadcast_id = m.broadcast_id
+    WHERE to_timestamp(substr(m.broadcast_id, 5)::bigint)::timestamp >= CURRENT_TIMESTAMP - make_interval(secs => $1)
+       OR j.updated_at >= CURRENT_TIMESTAMP - make_interval(secs => $1)
+"""
+
+
+async def upgrade(conn):
+    from config import BROADCAST_DELETE_WINDOW
+
+    await conn.execute(DDL)
+    # Older messages can no longer be deleted by the bot, so they are not copied
+    partitions = await conn.fetch(f'''
+        INSERT INTO broadcast_partitions (broadcast_id, created_at)
+        SELECT broadcast_id, sent_at FROM ({_RECENT}) recent
+        RETURNING id, broadcast_id
+    ''', float(BROADCAST_DELETE_WINDOW))
+    for row in partitions:
+        literal = row['broadcast_id'].replace("'", "''")
+        await conn.execute(
+            f"CREATE TABLE broadcast_messages_p{row['id']} PARTITION OF broadcast_messages FOR VALUES IN ('{literal}')"
+        )
+    if partitions:
+        await conn.execute('''
+            INSERT INTO broadcast_messages (broadcast_id, user_id, message_id)
+            SELECT broadcast_id, user_id, message_id FROM broadcast_messages_legacy
+            WHERE broadcast_id = ANY($1::text[])
+        ''', [row['broadcast_id'] for row in partitions])
+    await conn.execute('DROP TABLE broadcast_messages_legacy')
@@ -0,0 +1,6 @@
+-- Set when a send fails because the user blocked the bot (or the chat is gone),
+-- cleared by the next interaction (see LastSeenBuffer)
+ALTER TABLE users ADD COLUMN IF NOT EXISTS blocked_at TIMESTAMP;
+
+-- Reachable users in telegram_id order: broadcast targeting walks this index
+CREATE INDEX IF NOT EXISTS idx_users_reachable ON users (telegram_id) WHERE blocked_at IS NULL;
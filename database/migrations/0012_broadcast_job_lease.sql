@@ -0,0 +1,5 @@
+-- The instance running a job holds a lease it renews on every heartbeat and checkpoint.
+-- Other instances only take over a 'running' job once the lease has expired.
+ALTER TABLE broadcast_jobs
+    ADD COLUMN IF NOT EXISTS owner TEXT,
+    ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP;
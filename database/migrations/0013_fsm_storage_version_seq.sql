@@ -0,0 +1,6 @@
+-- Cleared FSM entries are deleted, so a key can be inserted again later.
+-- Versions come from one sequence so a re-created row never repeats a version
+-- that another replica may still have cached for the old row.
+CREATE SEQUENCE IF NOT EXISTS fsm_storage_version_seq;
+SELECT setval('fsm_storage_version_seq', GREATEST((SELECT MAX(version) FROM fsm_storage), 1));
+ALTER TABLE fsm_storage ALTER COLUMN version SET DEFAULT nextval('fsm_storage_version_seq');
@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+# Column lists match the field order below, so rows are built positionally: Video(*row)
+VIDEO_COLUMNS = "id, code, title, quality, file_id, file_type, storage_channel_id, storage_message_id, views_count, expires_at"
+CHANNEL_COLUMNS = "id, title, url, channel_id"
+
+
+@dataclass(slots=True)
+class Video:
+    id: int
+    code: str
+    title: str
+    quality: Optional[str]
+    file_id: Optional[str]
+    file_type: Optional[str]
+    storage_channel_id: Optional[str]
+    storage_message_id: Optional[int]
+    views_count: int
+    expires_at: Optional[datetime]
+
+
+@dataclass(slots=True)
+class Channel:
+    id: int
+    title: str
+    url: str
+    channel_id: str
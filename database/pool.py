@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+
+import asyncpg
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _TimedAcquire:
+    __slots__ = ("_owner", "_ctx")
+
+    def __init__(self, owner, ctx):
+        self._owner = owner
+        self._ctx = ctx
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        try:
+            return await self._ctx.__aenter__()
+        finally:
+            self._owner._record_wait(time.perf_counter() - started)
+
+    async def __aexit__(self, *exc):
+        return await self._ctx.__aexit__(*exc)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def _acquire(self):
+        started = time.perf_counter()
+        try:
+            return await self._ctx
+        finally:
+            self._owner._record_wait(time.perf_counter() - started)
+
+
+class InstrumentedPool:
+    """
+    Thin proxy around an asyncpg pool that times how long acquire() waits for
+    a free connection. Everything else is passed through unchanged.
+
+    warm() opens and pings `min_size` connections up front; start_keepalive()
+    repeats that periodically so idle connections are not closed and a
+    serverless endpoint (Neon) does not suspend between bursts of traffic.
+    """
+
+    def __init__(self, pool, slow_acquire=0.5):
+        self._pool = pool
+        self.slow_acquire = slow_acquire
+        self.stats = {"acquires": 0, "wait_total": 0.0, "wait_max": 0.0, "slow": 0, "pings_failed": 0}
+        self._keepalive_task = None
+
+    def acquire(self, *, timeout=None):
+        return _TimedAcquire(self, self._pool.acquire(timeout=timeout))
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    # Single-query shortcuts (like asyncpg's own), but with the acquire wait recorded
+    async def fetch(self, query, *args, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def execute(self, query, *args, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    def _record_wait(self, waited):
+        metrics.pool_acquire_wait.observe(waited)
+        self.stats["acquires"] += 1
+        self.stats["wait_total"] += waited
+        if waited > self.stats["wait_max"]:
+            self.stats["wait_max"] = waited
+        if waited >= self.slow_acquire:
+            self.stats["slow"] += 1
+
+    async def _ping(self):
+        async with self.acquire() as conn:
+            await conn.execute("SELECT 1")
+
+    async def warm(self):
+        """Pings min_size connections at once, so each of them is opened and used."""
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._ping() for _ in range(max(self._pool.get_min_size(), 1))),
+            return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        self.stats["pings_failed"] += len(failed)
+        if failed:
+            logger.warning(f"⚠️ Pool: {len(failed)} ta ulanishni isitib bo'lmadi: {failed[0]}")
+        return time.perf_counter() - started
+
+    def start_keepalive(self, interval):
+        if interval > 0 and self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._keepalive(interval))
+
+    async def _keepalive(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.warm()
+            except Exception as e:
+                logger.error(f"❌ Pool keepalive xatosi: {e}")
+
+    async def close(self):
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        await self._pool.close()
+
+    def get_stats(self):
+        acquires = self.stats["acquires"]
+        return {
+            **self.stats,
+            "wait_avg": self.stats["wait_total"] / acquires if acquires else 0.0,
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "max_size": self._pool.get_max_size(),
+        }
+
+
+async def create_pool(dsn, min_size, max_size, max_inactive_connection_lifetime,
+                      statement_cache_size, command_timeout):
+    pool = await asyncpg.create_pool(
+        dsn,
+        min_size=min_size,
+        max_size=max_size,
+        max_inactive_connection_lifetime=max_inactive_connection_lifetime,
+        statement_cache_size=statement_cache_size,
+        command_timeout=command_timeout or None,
+    )
+    return InstrumentedPool(pool)
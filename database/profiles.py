@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """
+    Bounded LRU cache of per-user profile fields (language and daily quota).
+
+    Entries are evicted when the cache is over max_size (least recently used
+    first), when they have not been read for idle_ttl seconds, or max_age
+    seconds after they were loaded however often they are read. Writes are
+    only applied to the local copy, so max_age bounds how long another
+    instance can serve a stale language or quota.
+    """
+
+    def __init__(self, max_size, idle_ttl, max_age):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age
+        self._entries = OrderedDict()  # telegram_id -> [last_access, loaded_at, profile dict]
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, telegram_id):
+        entry = self._entries.get(telegram_id)
+        now = time.monotonic()
+        if entry is None or now - entry[0] > self.idle_ttl or now - entry[1] > self.max_age:
+            if entry is not None:
+                del self._entries[telegram_id]
+                self.stats["evictions"] += 1
+            self.stats["misses"] += 1
+            return None
+        entry[0] = now
+        self._entries.move_to_end(telegram_id)
+        self.stats["hits"] += 1
+        return entry[2]
+
+    def put(self, telegram_id, profile):
+        now = time.monotonic()
+        self._entries[telegram_id] = [now, now, dict(profile)]
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def update(self, telegram_id, **fields):
+        # Write-through: only touches users that are already cached
+        entry = self._entries.get(telegram_id)
+        if entry is not None:
+            entry[2].update(fields)
+
+    def get_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_ratio = round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        return {**self.stats, "size": len(self._entries), "hit_ratio": hit_ratio}
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from database import catalog
+from database.db import get_pool
+from database.models import Video, Channel, VIDEO_COLUMNS, CHANNEL_COLUMNS
+from utils import metrics
+
+# Queries are module constants: asyncpg keeps a per-connection LRU of prepared
+# statements keyed by the SQL text (DB_STATEMENT_CACHE_SIZE), so each of these
+# is parsed and planned once per connection and then only bound and executed.
+_VIDEOS_BY_CODE = f'''
+    SELECT {VIDEO_COLUMNS} FROM videos
+    WHERE code = $1 AND (expires_at IS NULL OR expires_at > $2)
+    ORDER BY id
+'''
+_VIDEO_BY_ID = f'SELECT {VIDEO_COLUMNS} FROM videos WHERE id = $1'
+_CHANNELS = f'SELECT {CHANNEL_COLUMNS} FROM channels ORDER BY id'
+
+
+class Repository:
+    """
+    Typed read access for the hot paths, returning slotted models instead of
+    positional tuples. Every method is a single pool.fetch*/fetchrow call, so
+    the connection goes back to the pool as soon as the row is read.
+    """
+
+    @metrics.timed
+    async def get_videos_by_code(self, code):
+        # Served from the in-memory catalog; the DB is only used before it is loaded
+        cached = catalog.lookup(code)
+        if cached is not None:
+            return cached
+        pool = await get_pool()
+        return [Video(*row) for row in await pool.fetch(_VIDEOS_BY_CODE, code, datetime.now())]
+
+    @metrics.timed
+    async def get_video(self, video_id):
+        pool = await get_pool()
+        row = await pool.fetchrow(_VIDEO_BY_ID, int(video_id))
+        return Video(*row) if row else None
+
+    @metrics.timed
+    async def get_channels(self):
+        pool = await get_pool()
+        return [Channel(*row) for row in await pool.fetch(_CHANNELS)]
+
+
+repo = Repository()
@@ -12,9 +12,10 @@ logger = logging.getLogger(__name__)
 
 from keyboards.inline import get_admin_panel
 from keyboards.reply import get_admin_reply_keyboard
-from database.db import add_video, delete_code, get_all_codes, get_global_stats, get_all_users, save_broadcast_message, get_broadcast_messages, get_all_channels, add_channel, delete_channel, update_channel_title, get_video_by_code, check_code_exists
+from database.db import add_video, delete_code, get_all_codes, get_global_stats, get_broadcast_messages, count_broadcast_messages, mark_broadcast_recalled, drop_expired_broadcast_partitions, get_all_channels, add_channel, delete_channel, update_channel_title, check_code_exists
 from utils.states import AdminStates
-from config import ADMINS
+from utils.broadcast import create_broadcast, pause_broadcast, resume_broadcast, cancel_broadcast, get_job_keyboard
+from config import ADMINS, BROADCAST_DELETE_WINDOW
 
 admin_router = Router()
 
@@ -219,11 +220,13 @@ async def btn_admin_list(message: types.Message, state: FSMContext):
 @admin_router.message(F.text == "📊 Statistika")
 async def btn_admin_stats(message: types.Message, state: FSMContext):
     await state.clear()
-    total_users, active_users, videos = await get_global_stats()
+    total_users, active_users, videos, blocked_users = await get_global_stats()
     await message.answer(
         f"📊 <b>Bot Statistikasi:</b>\n\n"
         f"👥 Jami foydalanuvchilar: {total_users}\n"
         f"✅ Faol foydalanuvchilar: {active_users}\n"
+        f"📬 Xabar yetadiganlar: {total_users - blocked_users}\n"
+        f"🚫 Botni bloklaganlar: {blocked_users}\n"
         f"🎬 Kinolar soni: {videos}\n",
         parse_mode="HTML"
     )
@@ -246,58 +249,57 @@ async def process_broadcast(message: types.Message, state: FSMContext, bot: Bot)
         await state.clear()
         return
 
-    users = await get_all_users()
-    count = 0
-    blocked = 0
     broadcast_id = f"brd_{int(datetime.now().timestamp())}"
-    
-    status_msg = await message.answer(f"⏳ Tarqatish boshlandi: 0/{len(users)}")
-    
-    for user_id in users:
-        try:
-            sent = await bot.copy_message(
-                chat_id=user_id,
-                from_chat_id=message.chat.id,
-                message_id=message.message_id
-            )
-            await save_broadcast_message(broadcast_id, user_id, sent.message_id)
-            count += 1
-        except Exception:
-            blocked += 1
-        
-        # Update status every 50 users to avoid flooding
-        if (count + blocked) % 50 == 0:
-            try:
-                await status_msg.edit_text(f"⏳ Tarqatish jarayoni: {count + blocked}/{len(users)}")
-            except Exception:
-                pass
-        
-        # Small delay to avoid Telegram limits
-        await asyncio.sleep(0.05)
+    status_msg = await message.answer(
+        "⏳ Tarqatish boshlandi...",
+        reply_markup=get_job_keyboard(broadcast_id, 'running')
+    )
 
-    builder = InlineKeyboardBuilder()
-    builder.button(text="🗑 Hammaning telegramidan o'chirish", callback_data=f"del_brd:{broadcast_id}")
-    
-    await status_msg.edit_text(
-        f"✅ <b>Tarqatish yakunlandi!</b>\n\n"
-        f"👤 Jami foydalanuvchilar: {len(users)}\n"
-        f"✅ Muvaffaqiyatli bordi: {count}\n"
-        f"❌ Botni bloklaganlar: {blocked}\n\n"
-        f"☝️ <i>Xato ketgan bo'lsa, quyidagi tugma orqali o'chirib yuborishingiz mumkin:</i>",
-        reply_markup=builder.as_markup(),
-        parse_mode="HTML"
+    # Runs in the background so the admin's FSM handler is released immediately
+    job = await create_broadcast(
+        bot, broadcast_id,
+        from_chat_id=message.chat.id,
+        message_id=message.message_id,
+        admin_chat_id=message.chat.id,
+        status_message_id=status_msg.message_id
     )
+    logger.info(f"Broadcast {broadcast_id} started by admin {message.from_user.id} for {job.total} users")
     await state.clear()
 
+@admin_router.callback_query(F.data.startswith("brd_pause:"))
+async def cb_pause_broadcast(callback: types.CallbackQuery):
+    broadcast_id = callback.data.split(":")[1]
+    await pause_broadcast(broadcast_id)
+    await callback.answer("⏸ Joriy qism tugagach to'xtatiladi.")
+
+@admin_router.callback_query(F.data.startswith("brd_resume:"))
+async def cb_resume_broadcast(callback: types.CallbackQuery, bot: Bot):
+    broadcast_id = callback.data.split(":")[1]
+    job = await resume_broadcast(bot, broadcast_id)
+    if not job:
+        await callback.answer("❌ Bu tarqatishni davom ettirib bo'lmaydi.", show_alert=True)
+        return
+    try:
+        await callback.message.edit_reply_markup(reply_markup=get_job_keyboard(broadcast_id, 'running'))
+    except Exception:
+        pass
+    await callback.answer("▶️ Tarqatish davom ettirilmoqda.")
+
+@admin_router.callback_query(F.data.startswith("brd_cancel:"))
+async def cb_cancel_broadcast(callback: types.CallbackQuery):
+    broadcast_id = callback.data.split(":")[1]
+    await cancel_broadcast(broadcast_id)
+    await callback.answer("⛔ Tarqatish bekor qilinmoqda.")
+
 @admin_router.callback_query(F.data.startswith("del_brd:"))
 async def cb_delete_broadcast(callback: types.CallbackQuery, bot: Bot):
     broadcast_id = callback.data.split(":")[1]
-    messages = await get_broadcast_messages(broadcast_id)
+    total = await count_broadcast_messages(broadcast_id)
     
-    await callback.message.edit_text(f"⏳ O'chirish boshlandi: 0/{len(messages)}")
+    await callback.message.edit_text(f"⏳ O'chirish boshlandi: 0/{total}")
     
     count = 0
-    for user_id, msg_id in messages:
+    async for user_id, msg_id in get_broadcast_messages(broadcast_id):
         try:
             await bot.delete_message(chat_id=user_id, message_id=msg_id)
             count += 1
@@ -306,12 +308,16 @@ async def cb_delete_broadcast(callback: types.CallbackQuery, bot: Bot):
         
         if count % 50 == 0:
             try:
-                await callback.message.edit_text(f"⏳ O'chirilmoqda: {count}/{len(messages)}")
+                await callback.message.edit_text(f"⏳ O'chirilmoqda: {count}/{total}")
             except Exception:
                 pass
         
         await asyncio.sleep(0.05)
     
+    # The message ids are useless now: drop the broadcast's partition
+    await mark_broadcast_recalled(broadcast_id)
+    await drop_expired_broadcast_partitions(BROADCAST_DELETE_WINDOW)
+    
     await callback.message.edit_text(f"✅ <b>Reklama barcha foydalanuvchilardan o'chirib yuborildi!</b>\n\nJami o'chirildi: {count}", parse_mode="HTML")
     await callback.answer()
 
@@ -1,8 +1,7 @@
 from aiogram import Router, F, types, Bot
-from aiogram.types import FSInputFile
 from aiogram.filters import CommandStart, Command, StateFilter
 from aiogram.fsm.context import FSMContext
-from datetime import datetime, date
+from decimal import Decimal
 import asyncio
 import logging
 import html
@@ -10,10 +9,12 @@ import html
 logger = logging.getLogger(__name__)
 
 from database.db import (
-    add_user, get_user_stats, update_user_requests, 
-    get_video_by_code, get_video_by_id, increment_views, search_videos_by_title,
-    get_user_language, set_user_language, add_rating, get_rating_stats, get_all_channels, touch_user
+    add_user,
+    increment_views, search_videos_by_title,
+    get_user_language, set_user_language, add_rating, get_rating_stats, touch_user,
+    consume_daily_request
 )
+from database.repository import repo
 import math
 
 def format_size(bytes):
@@ -26,12 +27,16 @@ def format_size(bytes):
 from keyboards.inline import (
     get_main_menu, get_quality_keyboard, 
     get_subscribe_keyboard, get_language_keyboard,
-    get_video_share_keyboard, get_rating_selection_keyboard
+    get_video_share_keyboard, get_rating_selection_keyboard,
+    get_search_pagination_keyboard
 )
 from keyboards.reply import get_admin_reply_keyboard
 from utils.states import UserStates
 from utils.texts import TEXTS
-from config import DAILY_LIMIT, CHANNELS, ADMINS, WELCOME_PHOTO
+from utils.membership import membership_cache
+from utils.media import media_registry
+from utils.search import normalize as normalize_search, short_title
+from config import DAILY_LIMIT, QUOTA_TIERS, CHANNELS, ADMINS, WELCOME_PHOTO, SEARCH_PAGE_SIZE
 
 user_router = Router()
 
@@ -120,10 +125,8 @@ async def cb_set_lang(callback: types.CallbackQuery, bot: Bot, state: FSMContext
             except:
                 pass
             
-            photo = FSInputFile(WELCOME_PHOTO) if not WELCOME_PHOTO.startswith('http') else WELCOME_PHOTO
-            await bot.send_photo(
-                chat_id=user_id,
-                photo=photo,
+            await media_registry.send_photo(
+                bot, user_id, WELCOME_PHOTO,
                 caption=t['welcome'].format(name=name), 
                 parse_mode="HTML"
             )
@@ -162,42 +165,33 @@ async def cb_help(callback: types.CallbackQuery):
     await callback.answer()
 
 async def check_limit(user_id):
-    stats = await get_user_stats(user_id)
-    if not stats:
-        return True
-    requests, last_date = stats
-    today = str(date.today())
-    if last_date != today:
-        await update_user_requests(user_id, 1, today)
+    # Admins are never limited; everyone else goes through one atomic UPSERT
+    if user_id in ADMINS:
         return True
-    if requests >= DAILY_LIMIT:
-        return False
-    await update_user_requests(user_id, requests + 1, today)
-    return True
+    return await consume_daily_request(user_id, QUOTA_TIERS, DAILY_LIMIT)
 
-async def check_single_channel(bot: Bot, user_id: int, idx: int, channel: str):
+async def check_single_channel(bot: Bot, user_id: int, idx: int, channel: str, force: bool = False):
     # Ma'lumot: Agar channel_id telegramga tegishli bo'lmasa (Instagram va h.k.), tekshirmaymiz
     ch_id = str(channel)
     if not (ch_id.startswith('@') or ch_id.startswith('-100')):
         return None
         
     try:
-        member = await bot.get_chat_member(chat_id=ch_id, user_id=user_id)
-        if member.status in ["creator", "administrator", "member", "restricted"]:
+        if await membership_cache.is_member(bot, user_id, ch_id, force=force):
             return None
         return (idx, channel)
     except Exception:
         return (idx, channel)
 
-async def get_missing_channels(bot: Bot, user_id: int):
-    # Get dynamic channels from DB
-    db_channels = await get_all_channels()
+async def get_missing_channels(bot: Bot, user_id: int, force: bool = False):
+    # force=True skips the membership cache (used by the "Tasdiqlash" button)
+    db_channels = await repo.get_channels()
     if not db_channels:
         return []
         
-    tasks = [check_single_channel(bot, user_id, i, ch['channel_id']) for i, ch in enumerate(db_channels, 1)]
+    tasks = [check_single_channel(bot, user_id, i, ch.channel_id, force) for i, ch in enumerate(db_channels, 1)]
     results = await asyncio.gather(*tasks)
-    return [db_channels[r[0]-1] for r in results if r is not None] # Return the channel dict
+    return [db_channels[r[0]-1] for r in results if r is not None] # Return the Channel models
 
 @user_router.message(UserStates.entering_code)
 async def process_code(message: types.Message, state: FSMContext, bot: Bot):
@@ -215,13 +209,17 @@ async def process_code(message: types.Message, state: FSMContext, bot: Bot):
         await message.answer(t['sub_required'], reply_markup=await get_subscribe_keyboard(lang, bot, message.from_user.id, missing=missing))
         return
 
-    videos = await get_video_by_code(code)
+    videos = await repo.get_videos_by_code(code)
     if not videos:
         await message.answer(t['not_found'])
+    elif not await check_limit(message.from_user.id):
+        # Only successful lookups count against the daily quota
+        await message.answer(t['limit_reached'])
     else:
-        # video format: (title, quality, file_id, views_count, id, file_type, storage_channel_id, storage_message_id)
-        title, quality, file_id, views_count, video_id, file_type, storage_channel_id, storage_message_id = videos[0]
-        
+        video = videos[0]
+        title, file_id, video_id, file_type = video.title, video.file_id, video.id, video.file_type
+        storage_channel_id, storage_message_id = video.storage_channel_id, video.storage_message_id
+
         caption = f"{html.escape(title)}\n\n🤖 <b>Bot:</b> @{(await bot.get_me()).username}"
         avg_rating, count = await get_rating_stats(video_id)
         kb = get_video_share_keyboard((await bot.get_me()).username, video_id, avg_rating, count)
@@ -239,7 +237,7 @@ async def process_code(message: types.Message, state: FSMContext, bot: Bot):
                         reply_markup=kb,
                         protect_content=True
                     )
-                    await increment_views(video_id)
+                    increment_views(video_id)
                     await state.clear()
                     return
                 except Exception as e:
@@ -252,7 +250,7 @@ async def process_code(message: types.Message, state: FSMContext, bot: Bot):
                         )
                         # Forward doesn't support caption or buttons, so send them separately
                         await message.answer(caption, reply_markup=kb, parse_mode="HTML")
-                        await increment_views(video_id)
+                        increment_views(video_id)
                         await state.clear()
                         return
                     except Exception as e2:
@@ -269,7 +267,7 @@ async def process_code(message: types.Message, state: FSMContext, bot: Bot):
                 else:
                     await message.answer_video(video=file_id, caption=caption, parse_mode="HTML", reply_markup=kb, protect_content=True)
                 
-                await increment_views(video_id)
+                increment_views(video_id)
             else:
                 await message.answer("❌ Kinoni yuborishda xatolik yuz berdi (Fayl topilmadi).")
         except Exception as e:
@@ -279,23 +277,71 @@ async def process_code(message: types.Message, state: FSMContext, bot: Bot):
     await state.clear()
     return
 
+async def render_search_page(lang, query, cursors, page):
+    """Returns (text, keyboard, cursors) for one page of title search results."""
+    t = TEXTS[lang]
+    after = cursors[page]
+    if after is not None:
+        after = (Decimal(after[0]), after[1], after[2])
+    rows = await search_videos_by_title(query, SEARCH_PAGE_SIZE + 1, after)
+    has_next = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    if not rows:
+        return None, None, cursors
+
+    cursors = cursors[:page + 1]
+    if has_next:
+        _, _, rank, views, video_id = rows[-1]
+        # Stored in FSM data, so keep it JSON-friendly
+        cursors.append([str(rank), views, video_id])
+
+    res_list = ""
+    for code, title, *_ in rows:
+        res_list += f"• <code>{code}</code> - {html.escape(short_title(title))}\n"
+    text = t['search_results'].format(results=res_list)
+    return text, get_search_pagination_keyboard(page > 0, has_next), cursors
+
 @user_router.message(UserStates.searching_name)
 async def process_search_name(message: types.Message, state: FSMContext):
     lang = await get_user_language(message.from_user.id)
     t = TEXTS[lang]
+    await state.clear()
     
-    query = message.text
-    results = await search_videos_by_title(query)
+    query = normalize_search(message.text)
+    text, kb, cursors = await render_search_page(lang, query, [None], 0) if query else (None, None, None)
     
-    if not results:
+    if not text:
         await message.answer(t['no_results'])
-    else:
-        res_list = ""
-        for code, title in results:
-            res_list += f"• <code>{code}</code> - {html.escape(title)}\n"
-        await message.answer(t['search_results'].format(results=res_list), parse_mode="HTML")
+        return
     
-    await state.clear()
+    await message.answer(text, reply_markup=kb, parse_mode="HTML")
+    # Kept (without a state) so the ⬅️/➡️ buttons can fetch neighbouring pages
+    await state.update_data(search_query=query, search_cursors=cursors, search_page=0)
+
+@user_router.callback_query(F.data.startswith("search_page:"))
+async def cb_search_page(callback: types.CallbackQuery, state: FSMContext):
+    lang = await get_user_language(callback.from_user.id)
+    data = await state.get_data()
+    query = data.get('search_query')
+    if not query:
+        await callback.answer(TEXTS[lang]['search_name'], show_alert=True)
+        return
+
+    page = data.get('search_page', 0)
+    cursors = data.get('search_cursors', [None])
+    page = page + 1 if callback.data.endswith(":next") else page - 1
+    if page < 0 or page >= len(cursors):
+        await callback.answer()
+        return
+
+    text, kb, cursors = await render_search_page(lang, query, cursors, page)
+    if text:
+        try:
+            await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+        except Exception:
+            pass
+        await state.update_data(search_cursors=cursors, search_page=page)
+    await callback.answer()
 
 @user_router.callback_query(F.data == "check_subscription")
 async def cb_check_sub(callback: types.CallbackQuery, bot: Bot, state: FSMContext):
@@ -306,11 +352,11 @@ async def cb_check_sub(callback: types.CallbackQuery, bot: Bot, state: FSMContex
     
     await callback.answer(t['checking'])
     
-    missing = await get_missing_channels(bot, user_id)
+    missing = await get_missing_channels(bot, user_id, force=True)
     if not missing:
         await callback.message.delete()
-        await callback.message.answer_photo(
-            photo=FSInputFile(WELCOME_PHOTO) if not WELCOME_PHOTO.startswith('http') else WELCOME_PHOTO,
+        await media_registry.send_photo(
+            bot, callback.message.chat.id, WELCOME_PHOTO,
             caption=f"✅ {t['sub_check']}\n\n{t['welcome'].format(name=name)}", 
             parse_mode="HTML"
         )
@@ -342,15 +388,18 @@ async def cb_send_video(callback: types.CallbackQuery, bot: Bot, state: FSMConte
         await callback.answer()
         return
 
-    video_id = callback.data.split(":")[1]
-    video_data = await get_video_by_id(video_id)
-    
-    if not video_data:
+    video = await repo.get_video(int(callback.data.split(":")[1]))
+
+    if not video:
         await callback.answer("❌ Video topilmadi!")
         return
-        
-    # video format: (file_id, quality, title, views_count, file_type, storage_channel_id, storage_message_id)
-    file_id, quality, title, views_count, file_type, storage_channel_id, storage_message_id = video_data
+
+    if not await check_limit(callback.from_user.id):
+        await callback.answer(t['limit_reached'], show_alert=True)
+        return
+
+    title, file_id, video_id, file_type = video.title, video.file_id, video.id, video.file_type
+    storage_channel_id, storage_message_id = video.storage_channel_id, video.storage_message_id
     
     caption = f"{html.escape(title)}\n\n🤖 <b>Bot:</b> @{(await bot.get_me()).username}"
     avg_rating, count = await get_rating_stats(video_id)
@@ -368,7 +417,7 @@ async def cb_send_video(callback: types.CallbackQuery, bot: Bot, state: FSMConte
                     reply_markup=kb,
                     protect_content=True
                 )
-                await increment_views(video_id)
+                increment_views(video_id)
                 await callback.answer()
                 return
             except Exception as e:
@@ -380,7 +429,7 @@ async def cb_send_video(callback: types.CallbackQuery, bot: Bot, state: FSMConte
                         message_id=storage_message_id
                     )
                     await callback.message.answer(caption, reply_markup=kb, parse_mode="HTML")
-                    await increment_views(video_id)
+                    increment_views(video_id)
                     await callback.answer()
                     return
                 except Exception as e2:
@@ -397,7 +446,7 @@ async def cb_send_video(callback: types.CallbackQuery, bot: Bot, state: FSMConte
             else:
                 await callback.message.answer_video(video=file_id, caption=caption, parse_mode="HTML", reply_markup=kb, protect_content=True)
             
-            await increment_views(video_id)
+            increment_views(video_id)
             await callback.answer()
             return
         else:
@@ -432,11 +481,10 @@ async def cb_set_rate(callback: types.CallbackQuery, bot: Bot):
         stars = int(parts[2])
         user_id = callback.from_user.id
         
-        await add_rating(video_id, user_id, stars)
+        avg_rating, count = await add_rating(video_id, user_id, stars)
         await callback.answer(f"Rahmat! Siz {stars} ball berdingiz.", show_alert=True)
         
         # Update keyboard with new stats
-        avg_rating, count = await get_rating_stats(video_id)
         me = await bot.get_me()
         kb = get_video_share_keyboard(me.username, video_id, avg_rating, count)
         try:
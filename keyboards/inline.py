@@ -37,20 +37,21 @@ def get_admin_panel():
     return builder.as_markup()
 
 async def get_subscribe_keyboard(lang, bot=None, user_id=None, missing=None):
-    from database.db import get_all_channels
+    from database.repository import repo
+    from utils.membership import membership_cache
     import asyncio
     t = TEXTS[lang]
     builder = InlineKeyboardBuilder()
     
     # Get channels from DB
-    db_channels = await get_all_channels()
+    db_channels = await repo.get_channels()
     
     if missing is not None:
         # Use pre-calculated missing list if available (much faster!)
-        missing_ids = [str(ch['channel_id']) for ch in missing]
+        missing_ids = [str(ch.channel_id) for ch in missing]
         results = []
         for ch in db_channels:
-            ch_id = str(ch['channel_id'])
+            ch_id = str(ch.channel_id)
             # Agar bu telegram kanali bo'lmasa (masalan Instagram link), u "missing" bo'lolmaydi
             is_telegram = ch_id.startswith('@') or ch_id.startswith('-100')
             
@@ -61,7 +62,7 @@ async def get_subscribe_keyboard(lang, bot=None, user_id=None, missing=None):
             results.append((status, ch))
     else:
         async def check_member(ch):
-            ch_id = str(ch['channel_id'])
+            ch_id = str(ch.channel_id)
             # Telegram bo'lmagan linklar uchun tekshiruv shart emas
             if not (ch_id.startswith('@') or ch_id.startswith('-100')):
                 return "🔗", ch
@@ -69,8 +70,7 @@ async def get_subscribe_keyboard(lang, bot=None, user_id=None, missing=None):
             if not bot or not user_id:
                 return "✅", ch
             try:
-                member = await bot.get_chat_member(chat_id=ch_id, user_id=user_id)
-                if member.status in ["creator", "administrator", "member", "restricted"]:
+                if await membership_cache.is_member(bot, user_id, ch_id):
                     return "✅", ch
                 return "🔗", ch
             except Exception:
@@ -80,7 +80,7 @@ async def get_subscribe_keyboard(lang, bot=None, user_id=None, missing=None):
         results = await asyncio.gather(*[check_member(ch) for ch in db_channels])
     
     for status, ch in results:
-        builder.row(InlineKeyboardButton(text=f"{status} {ch['title']}", url=ch['url']))
+        builder.row(InlineKeyboardButton(text=f"{status} {ch.title}", url=ch.url))
     
     builder.row(InlineKeyboardButton(text=t['btn_check_sub'], callback_data="check_subscription"))
     return builder.as_markup()
@@ -104,3 +104,15 @@ def get_rating_selection_keyboard(video_id):
     builder.adjust(1)
     return builder.as_markup()
 
+
+def get_search_pagination_keyboard(has_prev, has_next):
+    if not (has_prev or has_next):
+        return None
+    builder = InlineKeyboardBuilder()
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(text="⬅️", callback_data="search_page:prev"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="➡️", callback_data="search_page:next"))
+    builder.row(*buttons)
+    return builder.as_markup()
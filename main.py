@@ -1,15 +1,33 @@
 import asyncio
+import bisect
+import hmac
+import json
 import logging
 import os
+from datetime import datetime
+
+import asyncpg
 from aiogram import Bot, Dispatcher, BaseMiddleware
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN, ADMINS
+from config import (
+    BOT_TOKEN, ADMINS, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONCURRENCY, WEBHOOK_MAX_PENDING, FSM_STATE_TTL, FSM_CACHE_TTL,
+    THROTTLE_MESSAGE_RATE, THROTTLE_MESSAGE_BURST, THROTTLE_CALLBACK_RATE, THROTTLE_CALLBACK_BURST,
+    THROTTLE_MAX_USERS
+)
 from handlers.user import user_router
 from handlers.admin import admin_router
-from database.db import init_db, close_db, touch_user
+from database.db import init_db, close_db, touch_user, get_pool, DATABASE_URL
+from database.fsm_storage import PostgresStorage
 
 from aiohttp import web
+from utils.http_cache import CachedBody, cached_response
+from utils.static_assets import StaticAssets
+from utils.webhook import WebhookHandler
+from utils.throttling import ThrottlingMiddleware
+from utils import metrics
+from utils.instrumentation import HandlerMetricsMiddleware, TelegramMetricsMiddleware, register_gauges
 
 # Configure logging
 logging.basicConfig(
@@ -21,17 +39,76 @@ logger = logging.getLogger(__name__)
 class UserTrackingMiddleware(BaseMiddleware):
     async def __call__(self, handler, event, data):
         if hasattr(event, "from_user") and event.from_user:
-            asyncio.create_task(touch_user(event.from_user.id))
+            touch_user(event.from_user.id)
         return await handler(event, data)
 
 async def handle_health_check(request):
     return web.Response(text="Bot is running!")
 
-async def handle_get_movies(request):
+async def handle_metrics(request):
+    # Prometheus text exposition format
+    return web.Response(
+        body=metrics.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+def _code_sort_key(code):
+    return (0, int(code), "") if code.isdigit() else (1, 0, code)
+
+# /api/movies snapshot, rebuilt only when the catalog changes or an entry expires
+_movies_snapshot = {"version": None, "next_expiry": None, "items": [], "keys": [], "body": None}
+
+async def get_movies_snapshot():
+    from database import catalog
+    global _movies_snapshot
     from database.db import get_all_codes
-    movies = await get_all_codes() # returns list of (code, title)
-    data = [{"code": m[0], "title": m[1]} for m in movies]
-    return web.json_response(data)
+    snap = _movies_snapshot
+    if catalog.is_ready():
+        expired = snap["next_expiry"] is not None and datetime.now() >= snap["next_expiry"]
+        if snap["version"] == catalog.version and not expired and snap["body"] is not None:
+            return snap
+        version = catalog.version
+        movies, next_expiry = catalog.list_movies()
+    else:
+        # Catalog not loaded yet: build from the database (not cached)
+        movies = await get_all_codes() # returns list of (code, title)
+        version, next_expiry = None, None
+
+    # Built in locals and published with one assignment: a request served while
+    # the body is compressed (or an overlapping rebuild) never sees a mixed snapshot
+    movies.sort(key=lambda m: _code_sort_key(m[0]))
+    items = [{"code": code, "title": title} for code, title in movies]
+    keys = [_code_sort_key(code) for code, _ in movies]
+    # Compression of the whole catalog is CPU-heavy; keep it off the event loop
+    body = json.dumps(items, ensure_ascii=False).encode("utf-8")
+    snap = {
+        "version": version, "next_expiry": next_expiry, "items": items, "keys": keys,
+        "body": await asyncio.to_thread(CachedBody, body, "application/json"),
+    }
+    if version is not None and (_movies_snapshot["version"] is None or version >= _movies_snapshot["version"]):
+        _movies_snapshot = snap
+    return snap
+
+async def handle_get_movies(request):
+    snap = await get_movies_snapshot()
+    limit = request.query.get("limit")
+    cursor = request.query.get("cursor")
+    if not limit and not cursor:
+        return cached_response(request, snap["body"])
+
+    # Paged: items after `cursor` (the last code of the previous page)
+    try:
+        limit = min(max(int(limit or 100), 1), 1000)
+    except ValueError:
+        return web.json_response({"error": "Invalid limit"}, status=400)
+    start = bisect.bisect_right(snap["keys"], _code_sort_key(cursor)) if cursor else 0
+    page = snap["items"][start:start + limit]
+    headers = {}
+    if start + limit < len(snap["items"]):
+        headers["X-Next-Cursor"] = page[-1]["code"]
+    # Built per request, so only the cheaper gzip variant
+    body = CachedBody(json.dumps(page, ensure_ascii=False).encode("utf-8"), "application/json", encodings=("gzip",))
+    return cached_response(request, body, headers=headers)
 
 async def handle_is_admin(request):
     from config import ADMINS
@@ -79,23 +156,113 @@ async def handle_delete_movie(request):
     await delete_code(code)
     return web.json_response({"success": True})
 
+async def handle_import_movies(request):
+    from database.importer import detect_format, import_lines, ImportTooLarge
+    from config import IMPORT_MAX_BYTES
+    if not has_api_token(request):
+        return web.json_response({"success": False, "error": "Unauthorized"}, status=403)
+
+    if request.content_length is not None and request.content_length > IMPORT_MAX_BYTES:
+        return web.json_response({"success": False, "error": "File too large"}, status=413)
+
+    async def body_lines():
+        # Raw CSV/JSONL body, decoded and parsed line by line as it arrives
+        size = 0
+        first = True
+        async for line in request.content:
+            size += len(line)
+            if size > IMPORT_MAX_BYTES:
+                raise ImportTooLarge()
+            yield line.decode("utf-8-sig" if first else "utf-8", errors="replace")
+            first = False
+
+    fmt = request.query.get('format') or detect_format(request.query.get('name'), request.content_type)
+    dry_run = request.query.get('dry_run') in ("1", "true")
+    # The connection is held for as long as the client takes to upload, so it is
+    # a dedicated one rather than a pool connection the bot handlers need
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        report = await import_lines(conn, body_lines(), fmt, dry_run=dry_run)
+    except ImportTooLarge:
+        return web.json_response({"success": False, "error": "File too large"}, status=413)
+    finally:
+        await conn.close()
+    return web.json_response({"success": True, "dry_run": dry_run, **report})
+
+def has_api_token(request):
+    """Checks `Authorization: Bearer <ADMIN_API_TOKEN>`; always False while no token is configured."""
+    from config import ADMIN_API_TOKEN
+    if not ADMIN_API_TOKEN:
+        return False
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), ADMIN_API_TOKEN.encode())
+
+async def handle_export(request):
+    from database.exporter import TABLES, FORMATS, GzipStream, copy_table, filename
+    # A query-string admin id can be forged by anyone; dumps need the real secret
+    if not has_api_token(request):
+        return web.json_response({"success": False, "error": "Unauthorized"}, status=403)
+    table = request.query.get('table', 'videos')
+    fmt = request.query.get('format', 'csv')
+    if table not in TABLES or fmt not in FORMATS:
+        return web.json_response({"success": False, "error": "Invalid table or format"}, status=400)
+
+    # Held for the whole download at the client's pace, so not taken from the pool
+    conn = await asyncpg.connect(DATABASE_URL)
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/gzip",
+        "Content-Disposition": f'attachment; filename="{filename(table, fmt)}"',
+    })
+    response.enable_chunked_encoding()
+    try:
+        await response.prepare(request)
+        # COPY output goes to the client chunk by chunk; write() waits while the client is slow
+        stream = GzipStream(response.write)
+        await copy_table(conn, table, fmt, stream)
+    finally:
+        await conn.close()
+    await stream.close()
+    await response.write_eof()
+    return response
+
 async def handle_get_stats(request):
-    from database.db import get_global_stats
+    from database.db import get_global_stats, view_counter, profile_cache, pg_pool
+    from database import catalog
+    from utils.membership import membership_cache
     from config import ADMINS
     admin_id = request.query.get('id')
     if not admin_id or int(admin_id) not in ADMINS:
         return web.json_response({"success": False, "error": "Unauthorized"}, status=403)
     
-    total_users, active_users, total_videos = await get_global_stats()
+    total_users, active_users, total_videos, blocked_users = await get_global_stats()
     return web.json_response({
         "total_users": total_users,
         "active_users": active_users,
-        "total_videos": total_videos
+        "reachable_users": total_users - blocked_users,
+        "blocked_users": blocked_users,
+        "total_videos": total_videos,
+        "catalog_cache": catalog.get_stats(),
+        "membership_cache": membership_cache.get_stats(),
+        "profile_cache": profile_cache.get_stats(),
+        "pending_views": view_counter.pending,
+        "db_pool": pg_pool.get_stats() if pg_pool else None
     })
 
+WEBAPP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webapp")
+webapp_assets = StaticAssets(WEBAPP_DIR)
+
 async def handle_webapp(request):
-    with open("webapp/index.html", "r", encoding="utf-8") as f:
-        return web.Response(text=f.read(), content_type="text/html")
+    asset = webapp_assets.get("index.html")
+    if asset is None:
+        raise web.HTTPNotFound()
+    # The page is revalidated on every launch, which costs a 304 when unchanged
+    return cached_response(request, asset, cache_control="no-cache")
+
+async def handle_webapp_asset(request):
+    asset = webapp_assets.get(request.match_info["name"])
+    if asset is None:
+        raise web.HTTPNotFound()
+    return cached_response(request, asset, cache_control="public, max-age=3600")
 
 async def main():
     # Initialize database
@@ -103,7 +270,14 @@ async def main():
     
     # Initialize bot and dispatcher
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    bot.session.middleware(TelegramMetricsMiddleware())
+    if DATABASE_URL:
+        # FSM states survive restarts and are shared between replicas
+        storage = PostgresStorage(await get_pool(), cache_ttl=FSM_CACHE_TTL, state_ttl=FSM_STATE_TTL)
+        storage.start()
+    else:
+        storage = MemoryStorage()
+    dp = Dispatcher(storage=storage)
     
     # Set Menu Button (Web App)
     from aiogram.types import WebAppInfo, MenuButtonWebApp
@@ -116,23 +290,43 @@ async def main():
     except Exception as e:
         logger.error(f"❌ Could not set menu button: {e}")
     
-    # Register middleware
+    # Register middleware (throttling first, so dropped updates cost nothing)
+    dp.message.middleware(ThrottlingMiddleware(THROTTLE_MESSAGE_RATE, THROTTLE_MESSAGE_BURST, THROTTLE_MAX_USERS))
+    dp.callback_query.middleware(ThrottlingMiddleware(THROTTLE_CALLBACK_RATE, THROTTLE_CALLBACK_BURST, THROTTLE_MAX_USERS))
     dp.message.middleware(UserTrackingMiddleware())
     dp.callback_query.middleware(UserTrackingMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
     
     # Include routers
     dp.include_router(admin_router)
     dp.include_router(user_router)
+
+    webhook_handler = None
+    if WEBHOOK_URL:
+        # Without the secret anyone could post updates posing as an admin
+        if not WEBHOOK_SECRET:
+            raise RuntimeError("WEBHOOK_SECRET must be set to run in webhook mode")
+        webhook_handler = WebhookHandler(dp, bot, WEBHOOK_SECRET, WEBHOOK_MAX_CONCURRENCY, WEBHOOK_MAX_PENDING)
+    register_gauges(await get_pool() if DATABASE_URL else None, webhook_handler)
+
     # Start web server
     try:
+        await webapp_assets.start()
         app = web.Application()
+        if webhook_handler:
+            app.router.add_post(WEBHOOK_PATH, webhook_handler)
         app.router.add_get("/", handle_webapp)
+        app.router.add_get("/webapp/{name:.+}", handle_webapp_asset)
         app.router.add_get("/health", handle_health_check)
+        app.router.add_get("/metrics", handle_metrics)
         app.router.add_get("/api/movies", handle_get_movies)
         app.router.add_get("/api/is_admin", handle_is_admin)
         app.router.add_post("/api/add_movie", handle_add_movie)
         app.router.add_post("/api/delete_movie", handle_delete_movie)
         app.router.add_get("/api/stats", handle_get_stats)
+        app.router.add_post("/api/import_movies", handle_import_movies)
+        app.router.add_get("/api/export", handle_export)
         runner = web.AppRunner(app)
         await runner.setup()
         port = int(os.getenv("PORT", 8080))
@@ -140,10 +334,51 @@ async def main():
         await site.start()
         logger.info(f"Health check server started on port {port}")
     except Exception as e:
+        if webhook_handler:
+            # Without the server there is no way to receive updates
+            raise
         logger.warning(f"Could not start health check server: {e}. If you are running locally, this is normal.")
 
-    # Start polling
-    await dp.start_polling(bot)
+    # Telegram file_ids of static media (welcome banner etc.)
+    from utils.media import media_registry
+    try:
+        await media_registry.load()
+    except Exception as e:
+        logger.error(f"❌ Could not load media file_ids: {e}")
+
+    # Continue broadcasts interrupted by a restart or left behind by another instance
+    from utils.broadcast import watch_unfinished_broadcasts, stop_broadcasts, retention_loop
+    broadcast_task = asyncio.create_task(watch_unfinished_broadcasts(bot)) if DATABASE_URL else None
+    retention_task = asyncio.create_task(retention_loop()) if DATABASE_URL else None
+
+    try:
+        if webhook_handler:
+            # Updates arrive on the aiohttp server started above
+            await bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info(f"✅ Webhook mode: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+            await asyncio.Event().wait()
+        else:
+            # Start polling
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if retention_task:
+            retention_task.cancel()
+        if broadcast_task:
+            broadcast_task.cancel()
+            try:
+                await stop_broadcasts()
+            except Exception as e:
+                logger.error(f"❌ Could not release broadcast jobs: {e}")
+        if webhook_handler:
+            await webhook_handler.drain()
+        await webapp_assets.stop()
+        await storage.close()
+        await close_db()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,431 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from config import (
+    BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_MAX_RETRIES, BROADCAST_BATCH_SIZE,
+    BROADCAST_DELETE_WINDOW, BROADCAST_RETENTION_INTERVAL, BROADCAST_LEASE_TTL
+)
+from database.db import (
+    create_broadcast_job, get_broadcast_job, claim_broadcast_jobs, renew_broadcast_lease,
+    release_broadcast_jobs, set_broadcast_job_status, save_broadcast_checkpoint, iter_user_ids, count_users,
+    ensure_broadcast_partition, drop_expired_broadcast_partitions
+)
+
+logger = logging.getLogger(__name__)
+
+# How often the admin's status message is refreshed (seconds)
+STATUS_INTERVAL = 5
+
+# Lease owner name of this process; a job is run only by the instance holding its lease
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class TokenBucket:
+    """Global send limiter shared by every broadcast worker."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        # RetryAfter applies to the whole bot, so every worker has to wait
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+limiter = TokenBucket(BROADCAST_RATE)
+
+
+def target_filters(target):
+    """
+    iter_user_ids/count_users filters for a job's target, e.g.
+    {"language": "ru", "active_days": 30, "include_blocked": false}.
+    """
+    if isinstance(target, str):
+        target = json.loads(target)
+    target = target or {}
+    return {
+        "language": target.get("language"),
+        "active_days": target.get("active_days"),
+        "include_blocked": bool(target.get("include_blocked")),
+    }
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} soat {seconds % 3600 // 60} daq"
+    if seconds >= 60:
+        return f"{seconds // 60} daq {seconds % 60} s"
+    return f"{seconds} s"
+
+
+def get_job_keyboard(broadcast_id, status):
+    builder = InlineKeyboardBuilder()
+    if status == 'running':
+        builder.button(text="⏸ To'xtatish", callback_data=f"brd_pause:{broadcast_id}")
+    elif status == 'paused':
+        builder.button(text="▶️ Davom ettirish", callback_data=f"brd_resume:{broadcast_id}")
+    builder.button(text="⛔ Bekor qilish", callback_data=f"brd_cancel:{broadcast_id}")
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def get_finished_keyboard(broadcast_id):
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🗑 Hammaning telegramidan o'chirish", callback_data=f"del_brd:{broadcast_id}")
+    return builder.as_markup()
+
+
+class BroadcastJob:
+    """
+    Copies one message to every user, walking users.telegram_id in chunks.
+
+    After each chunk the cursor, counters and sent message ids are stored in
+    broadcast_jobs, so the job can resume from there after a restart.
+
+    The runner holds a lease on its row (owner + lease_until) and renews it on
+    every heartbeat and checkpoint. Both return the stored status, so a pause
+    or cancel written by another instance stops the job after the current
+    chunk; if the lease was taken over, the runner stops without writing.
+    """
+
+    def __init__(self, bot: Bot, row):
+        self.bot = bot
+        self.broadcast_id = row['broadcast_id']
+        self.from_chat_id = row['from_chat_id']
+        self.message_id = row['message_id']
+        self.admin_chat_id = row['admin_chat_id']
+        self.status_message_id = row['status_message_id']
+        self.cursor = row['cursor']
+        self.total = row['total']
+        self.sent = row['sent']
+        self.blocked = row['blocked']
+        self.failed = row['failed']
+        self.status = 'running'
+        self.task = None
+        self.started_at = None
+        self._done_at_start = self.done
+        self._records = []
+        self._blocked_ids = []  # users to mark blocked_at at the next checkpoint
+        self.filters = target_filters(row.get('target'))
+
+    @property
+    def done(self):
+        return self.sent + self.blocked + self.failed
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return (self.done - self._done_at_start) / elapsed if elapsed > 0 else 0.0
+
+    def progress_text(self):
+        rate = self.throughput()
+        eta = format_eta(max(self.total - self.done, 0) / rate) if rate > 0 else "—"
+        header = "⏸ Tarqatish to'xtatildi" if self.status == 'paused' else "⏳ Tarqatish jarayoni"
+        return (
+            f"{header}: {self.done}/{self.total}\n"
+            f"✅ {self.sent} | 🚫 {self.blocked} | ❌ {self.failed}\n"
+            f"⚡️ {rate:.1f} xabar/s | ⏱ Qoldi: {eta}"
+        )
+
+    async def _edit_status(self, text, reply_markup=None, parse_mode=None):
+        if not self.status_message_id:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=self.admin_chat_id,
+                message_id=self.status_message_id,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
+        except Exception:
+            pass
+
+    async def run(self):
+        self.started_at = time.monotonic()
+        # Created on the first run; recreated if a long pause outlived the retention window
+        await ensure_broadcast_partition(self.broadcast_id)
+        queue = asyncio.Queue(maxsize=BROADCAST_WORKERS * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(BROADCAST_WORKERS)]
+        reporter = asyncio.create_task(self._report())
+        try:
+            # Users are read one chunk at a time, so memory does not grow with the audience
+            chunks = iter_user_ids(BROADCAST_BATCH_SIZE, after=self.cursor, **self.filters)
+            async for chunk in chunks:
+                for user_id in chunk:
+                    await queue.put(user_id)
+                await queue.join()
+                await self._checkpoint(chunk[-1])
+                if self.status != 'running':
+                    break
+            else:
+                if self.status == 'running':
+                    self.status = 'done'
+            await chunks.aclose()
+        finally:
+            for task in workers:
+                task.cancel()
+            reporter.cancel()
+            await asyncio.gather(*workers, reporter, return_exceptions=True)
+
+        if self.status == 'lost':
+            logger.warning(f"⚠️ {self.broadcast_id}: boshqa nusxa davom ettirmoqda, to'xtatildi.")
+            return
+        if self.status == 'stopping':
+            # Shutting down: leave the job 'running' for another instance to claim right away
+            await release_broadcast_jobs(INSTANCE_ID, self.broadcast_id)
+            logger.info(f"📢 {self.broadcast_id}: cursor={self.cursor} da bo'shatildi.")
+            return
+        await set_broadcast_job_status(self.broadcast_id, self.status, owner=INSTANCE_ID)
+        logger.info(
+            f"📢 {self.broadcast_id} [{self.status}]: {self.sent} yuborildi, "
+            f"{self.blocked} bloklangan, {self.failed} xato ({self.throughput():.1f} xabar/s)"
+        )
+        if self.status == 'done':
+            await self._edit_status(
+                f"✅ <b>Tarqatish yakunlandi!</b>\n\n"
+                f"👤 Jami foydalanuvchilar: {self.total}\n"
+                f"✅ Muvaffaqiyatli bordi: {self.sent}\n"
+                f"🚫 Botni bloklaganlar: {self.blocked}\n"
+                f"❌ Xatolik bilan: {self.failed}\n"
+                f"⚡️ O'rtacha tezlik: {self.throughput():.1f} xabar/s\n\n"
+                f"☝️ <i>Xato ketgan bo'lsa, quyidagi tugma orqali o'chirib yuborishingiz mumkin:</i>",
+                reply_markup=get_finished_keyboard(self.broadcast_id),
+                parse_mode="HTML"
+            )
+        elif self.status == 'paused':
+            await self._edit_status(self.progress_text(), reply_markup=get_job_keyboard(self.broadcast_id, 'paused'))
+        elif self.status == 'cancelled':
+            await self._edit_status(
+                f"⛔ <b>Tarqatish bekor qilindi.</b>\n\n"
+                f"✅ Yuborildi: {self.sent}\n"
+                f"🚫 Botni bloklaganlar: {self.blocked}\n"
+                f"❌ Xatolik bilan: {self.failed}",
+                reply_markup=get_finished_keyboard(self.broadcast_id) if self.sent else None,
+                parse_mode="HTML"
+            )
+
+    async def _checkpoint(self, cursor):
+        records, self._records = self._records, []
+        blocked_ids, self._blocked_ids = self._blocked_ids, []
+        self.cursor = cursor
+        stored = await save_broadcast_checkpoint(
+            self.broadcast_id, records, cursor, self.sent, self.blocked, self.failed, blocked_ids,
+            owner=INSTANCE_ID, lease_ttl=BROADCAST_LEASE_TTL
+        )
+        self._apply_stored_status(stored)
+
+    def _apply_stored_status(self, stored):
+        if stored is None:
+            self.status = 'lost'
+        elif stored in ('paused', 'cancelled') and self.status == 'running':
+            # Paused or cancelled from another instance
+            self.status = stored
+
+    async def _worker(self, queue):
+        while True:
+            user_id = await queue.get()
+            try:
+                await self._send(user_id)
+            finally:
+                queue.task_done()
+
+    async def _send(self, user_id):
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            try:
+                sent = await self.bot.copy_message(
+                    chat_id=user_id,
+                    from_chat_id=self.from_chat_id,
+                    message_id=self.message_id
+                )
+            except TelegramRetryAfter as e:
+                logger.warning(f"⏸ Flood limit: {e.retry_after} s kutamiz.")
+                limiter.pause(e.retry_after)
+                continue
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                if attempt > BROADCAST_MAX_RETRIES:
+                    logger.error(f"Broadcast to {user_id} failed after retries: {e}")
+                    self.failed += 1
+                    return
+                await asyncio.sleep(2 ** attempt)
+                continue
+            except TelegramForbiddenError:
+                # Blocked by the user or the account is deactivated
+                self.blocked += 1
+                self._blocked_ids.append(user_id)
+                return
+            except TelegramBadRequest as e:
+                # Only a missing chat means the user is gone; other errors are about the message
+                if "chat not found" in str(e).lower():
+                    self.blocked += 1
+                    self._blocked_ids.append(user_id)
+                else:
+                    logger.error(f"Broadcast to {user_id} failed: {e}")
+                    self.failed += 1
+                return
+            except Exception as e:
+                logger.error(f"Broadcast to {user_id} failed: {e}")
+                self.failed += 1
+                return
+            self.sent += 1
+            self._records.append((self.broadcast_id, int(user_id), sent.message_id))
+            return
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            try:
+                stored = await renew_broadcast_lease(self.broadcast_id, INSTANCE_ID, BROADCAST_LEASE_TTL)
+                self._apply_stored_status(stored)
+            except Exception as e:
+                logger.error(f"❌ {self.broadcast_id}: lease yangilanmadi: {e}")
+            await self._edit_status(self.progress_text(), reply_markup=get_job_keyboard(self.broadcast_id, self.status))
+
+
+# Running jobs by broadcast_id; also keeps their tasks from being garbage collected
+active_jobs = {}
+
+
+def start_job(job: BroadcastJob):
+    def on_done(task):
+        active_jobs.pop(job.broadcast_id, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"❌ {job.broadcast_id} to'xtab qoldi: {task.exception()}")
+
+    task = asyncio.create_task(job.run())
+    job.task = task
+    active_jobs[job.broadcast_id] = job
+    task.add_done_callback(on_done)
+    return job
+
+
+async def create_broadcast(bot: Bot, broadcast_id, from_chat_id, message_id, admin_chat_id, status_message_id, target=None):
+    total = await count_users(**target_filters(target))
+    row = await create_broadcast_job(
+        broadcast_id, from_chat_id, message_id, admin_chat_id, status_message_id, target, total,
+        owner=INSTANCE_ID, lease_ttl=BROADCAST_LEASE_TTL
+    )
+    return start_job(BroadcastJob(bot, row))
+
+
+async def _set_stored_status(broadcast_id, status):
+    # Jobs that are not running in this process; finished jobs stay untouched
+    row = await get_broadcast_job(broadcast_id)
+    if row and row['status'] in ('running', 'paused'):
+        await set_broadcast_job_status(broadcast_id, status)
+
+
+async def pause_broadcast(broadcast_id):
+    job = active_jobs.get(broadcast_id)
+    if job:
+        # The runner stops after the current chunk and stores the status itself
+        job.status = 'paused'
+    else:
+        await _set_stored_status(broadcast_id, 'paused')
+
+
+async def cancel_broadcast(broadcast_id):
+    job = active_jobs.get(broadcast_id)
+    if job:
+        job.status = 'cancelled'
+    else:
+        await _set_stored_status(broadcast_id, 'cancelled')
+
+
+async def resume_broadcast(bot: Bot, broadcast_id):
+    job = active_jobs.get(broadcast_id)
+    if job:
+        # Still finishing its current chunk: just keep it going
+        job.status = 'running'
+        return job
+    row = await get_broadcast_job(broadcast_id)
+    if not row or row['status'] not in ('running', 'paused'):
+        return None
+    await set_broadcast_job_status(broadcast_id, 'running')
+    claimed = await claim_broadcast_jobs(INSTANCE_ID, BROADCAST_LEASE_TTL, broadcast_id)
+    if not claimed:
+        # Another instance still holds the lease; its runner sees 'running' at the next heartbeat
+        return row
+    return start_job(BroadcastJob(bot, claimed[0]))
+
+
+async def resume_unfinished_broadcasts(bot: Bot):
+    """Starts running jobs that no live instance holds a lease on."""
+    for row in await claim_broadcast_jobs(INSTANCE_ID, BROADCAST_LEASE_TTL):
+        if row['broadcast_id'] in active_jobs:
+            continue
+        logger.info(f"🔁 {row['broadcast_id']} davom ettirilmoqda (cursor={row['cursor']}).")
+        start_job(BroadcastJob(bot, row))
+
+
+async def watch_unfinished_broadcasts(bot: Bot):
+    """Claims jobs at startup and later picks up those whose owner stopped renewing its lease."""
+    while True:
+        try:
+            await resume_unfinished_broadcasts(bot)
+        except Exception as e:
+            logger.error(f"❌ Tarqatishlarni davom ettirib bo'lmadi: {e}")
+        await asyncio.sleep(BROADCAST_LEASE_TTL)
+
+
+async def stop_broadcasts(timeout=10):
+    """
+    On shutdown: lets running jobs finish their current chunk and release their
+    leases, so another instance resumes them without waiting for expiry.
+    """
+    jobs = list(active_jobs.values())
+    for job in jobs:
+        job.status = 'stopping'
+    tasks = [job.task for job in jobs]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await release_broadcast_jobs(INSTANCE_ID)
+
+
+async def retention_loop():
+    """Periodically drops sent-message partitions that can no longer be recalled."""
+    while True:
+        try:
+            dropped = await drop_expired_broadcast_partitions(BROADCAST_DELETE_WINDOW)
+            if dropped:
+                logger.info(f"🧹 Eski tarqatish xabarlari o'chirildi: {', '.join(dropped)}")
+        except Exception as e:
+            logger.error(f"❌ Tarqatish xabarlarini tozalab bo'lmadi: {e}")
+        await asyncio.sleep(BROADCAST_RETENTION_INTERVAL)
@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it responses are only gzip-compressed
+    brotli = None
+
+
+class CachedBody:
+    """A response body prepared once: strong ETag plus gzip/brotli variants."""
+
+    def __init__(self, body: bytes, content_type, charset="utf-8", last_modified=None, encodings=("br", "gzip")):
+        self.body = body
+        self.content_type = content_type
+        self.charset = charset
+        self.etag = hashlib.sha1(body).hexdigest()
+        # HTTP dates have one-second precision
+        self.last_modified_ts = int(last_modified) if last_modified else None
+        self.last_modified = formatdate(self.last_modified_ts, usegmt=True) if last_modified else None
+        self.encoded = {}
+        if "gzip" in encodings:
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=9)
+        if "br" in encodings and brotli is not None:
+            self.encoded["br"] = brotli.compress(body)
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        # Encoded variants carry a suffix ("<etag>-gzip"); they are the same resource
+        if tag.strip('"').split("-")[0] == etag:
+            return True
+    return False
+
+
+def _not_modified_since(request, cached: CachedBody):
+    header = request.headers.get("If-Modified-Since")
+    if not header or cached.last_modified_ts is None:
+        return False
+    try:
+        return cached.last_modified_ts <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _pick_encoding(request, cached: CachedBody):
+    accepted = request.headers.get("Accept-Encoding", "")
+    for encoding in ("br", "gzip"):
+        if encoding in cached.encoded and encoding in accepted:
+            return encoding
+    return None
+
+
+def cached_response(request, cached: CachedBody, cache_control="no-cache", headers=None):
+    """Serves a CachedBody with ETag revalidation and the best pre-compressed variant."""
+    common = {"Cache-Control": cache_control, "Vary": "Accept-Encoding", **(headers or {})}
+    if cached.last_modified:
+        common["Last-Modified"] = cached.last_modified
+
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    if "If-None-Match" in request.headers:
+        not_modified = _etag_matches(request, cached.etag)
+    else:
+        not_modified = _not_modified_since(request, cached)
+    if not_modified:
+        return web.Response(status=304, headers={"ETag": f'"{cached.etag}"', **common})
+
+    encoding = _pick_encoding(request, cached)
+    if encoding:
+        body = cached.encoded[encoding]
+        common["Content-Encoding"] = encoding
+        common["ETag"] = f'"{cached.etag}-{encoding}"'
+    else:
+        body = cached.body
+        common["ETag"] = f'"{cached.etag}"'
+    return web.Response(body=body, content_type=cached.content_type, charset=cached.charset, headers=common)
@@ -0,0 +1,72 @@
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from utils import metrics
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Records latency and exceptions per handler function (inner middleware)."""
+
+    async def __call__(self, handler, event, data):
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            metrics.handler_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.handler_latency.observe(time.perf_counter() - started, name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Records latency and errors of outgoing Bot API calls per method."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            metrics.telegram_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.telegram_latency.observe(time.perf_counter() - started, name)
+
+
+def _hit_ratio(stats):
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
+
+
+def register_gauges(pool=None, webhook_handler=None):
+    """Gauges for pool usage, background queue depths and cache hit ratios."""
+    from database import catalog
+    from database.db import last_seen_buffer, view_counter, profile_cache
+    from utils.broadcast import active_jobs
+    from utils.membership import membership_cache
+
+    if pool is not None:
+        metrics.Gauge("bot_db_pool_size", "Open pool connections", pool.get_size)
+        metrics.Gauge("bot_db_pool_idle", "Idle pool connections", pool.get_idle_size)
+        metrics.Gauge("bot_db_pool_max_size", "Pool size limit", pool.get_max_size)
+
+    def queues():
+        depths = {
+            "last_seen": last_seen_buffer.pending,
+            "views": view_counter.pending,
+            "broadcast_jobs": len(active_jobs),
+        }
+        if webhook_handler is not None:
+            depths["webhook"] = webhook_handler.pending
+        return depths
+
+    metrics.Gauge("bot_queue_depth", "Items waiting in background queues", queues, ("queue",))
+    metrics.Gauge("bot_cache_hit_ratio", "Cache hit ratio since start", lambda: {
+        "catalog": _hit_ratio(catalog.stats),
+        "membership": _hit_ratio(membership_cache.stats),
+        "profile": _hit_ratio(profile_cache.stats),
+    }, ("cache",))
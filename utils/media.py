@@ -0,0 +1,81 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+
+from database.db import get_media_file_ids, save_media_file_id
+
+logger = logging.getLogger(__name__)
+
+
+def _checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaRegistry:
+    """
+    Uploads each static asset once and sends it by Telegram file_id afterwards.
+
+    The file_id is stored in the media_files table together with the file's
+    checksum, so a changed asset or a rejected file_id triggers a new upload.
+    """
+
+    def __init__(self):
+        self._file_ids = {}   # name -> (checksum, file_id)
+        self._stats = {}      # path -> ((mtime, size), checksum)
+        self._locks = {}
+
+    async def load(self):
+        self._file_ids = await get_media_file_ids()
+        logger.info(f"🖼 {len(self._file_ids)} ta media file_id yuklandi.")
+
+    async def _current_checksum(self, path):
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._stats.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        checksum = await asyncio.to_thread(_checksum, path)
+        self._stats[path] = (key, checksum)
+        return checksum
+
+    async def send_photo(self, bot: Bot, chat_id, path, **kwargs):
+        if path.startswith('http'):
+            return await bot.send_photo(chat_id=chat_id, photo=path, **kwargs)
+
+        name = os.path.basename(path)
+        checksum = await self._current_checksum(path)
+        cached = self._file_ids.get(name)
+        if cached and cached[0] == checksum:
+            try:
+                return await bot.send_photo(chat_id=chat_id, photo=cached[1], **kwargs)
+            except TelegramBadRequest as e:
+                logger.warning(f"⚠️ {name} file_id rad etildi ({e}), qayta yuklanadi.")
+                self._file_ids.pop(name, None)
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            # Another sender may have uploaded it while we were waiting
+            cached = self._file_ids.get(name)
+            if cached and cached[0] == checksum:
+                return await bot.send_photo(chat_id=chat_id, photo=cached[1], **kwargs)
+            message = await bot.send_photo(chat_id=chat_id, photo=FSInputFile(path), **kwargs)
+            file_id = message.photo[-1].file_id
+            self._file_ids[name] = (checksum, file_id)
+            try:
+                await save_media_file_id(name, checksum, file_id)
+            except Exception as e:
+                logger.error(f"❌ {name} file_id saqlanmadi: {e}")
+            logger.info(f"🖼 {name} yuklandi, file_id saqlandi.")
+            return message
+
+
+media_registry = MediaRegistry()
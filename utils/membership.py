@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from config import MEMBERSHIP_POSITIVE_TTL, MEMBERSHIP_NEGATIVE_TTL, MEMBERSHIP_CACHE_SIZE
+
+MEMBER_STATUSES = ("creator", "administrator", "member", "restricted")
+
+
+class MembershipCache:
+    """
+    Caches get_chat_member results per (user_id, channel_id).
+
+    Positive and negative answers have separate TTLs, and concurrent checks
+    for the same key share a single in-flight Telegram call.
+    """
+
+    def __init__(self, positive_ttl, negative_ttl, max_size):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._inflight = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def is_member(self, bot, user_id, channel_id, force=False):
+        key = (user_id, str(channel_id))
+        if not force:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.stats["hits"] += 1
+                return entry[0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._fetch(bot, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # shield: a cancelled waiter must not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _fetch(self, bot, key):
+        user_id, channel_id = key
+        member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
+        is_member = member.status in MEMBER_STATUSES
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            # Evict the oldest entry (dicts keep insertion order)
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (is_member, time.monotonic() + ttl)
+        return is_member
+
+    def get_stats(self):
+        return {**self.stats, "size": len(self._entries)}
+
+
+membership_cache = MembershipCache(MEMBERSHIP_POSITIVE_TTL, MEMBERSHIP_NEGATIVE_TTL, MEMBERSHIP_CACHE_SIZE)
@@ -0,0 +1,209 @@
+"""
+Minimal Prometheus-style metrics (counters, histograms and callback gauges).
+
+Recording is a dict lookup plus a couple of additions, so it is cheap enough
+for every handler, query and Bot API call. render() produces the text
+exposition format served on /metrics.
+"""
+import bisect
+import functools
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, value in self._values.items():
+            lines.append(f"{self.name}{_fmt_labels(self.labels, values)} {_fmt_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.buckets):
+            series[idx] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, values, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, values, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, values)} {_fmt_value(series[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+class Gauge:
+    """Value read at scrape time from a callback returning a number or {label values: number}."""
+
+    def __init__(self, name, help_text, callback, labels=()):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.callback()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            for values, v in value.items():
+                values = values if isinstance(values, tuple) else (values,)
+                lines.append(f"{self.name}{_fmt_labels(self.labels, values)} {_fmt_value(v)}")
+        elif value is not None:
+            lines.append(f"{self.name} {_fmt_value(value)}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Shared metrics ---
+handler_latency = Histogram("bot_handler_duration_seconds", "aiogram handler latency", ("handler",))
+handler_errors = Counter("bot_handler_errors_total", "aiogram handler exceptions", ("handler", "error"))
+db_latency = Histogram("bot_db_query_duration_seconds", "database/db.py function latency", ("function",))
+db_errors = Counter("bot_db_errors_total", "database/db.py function exceptions", ("function", "error"))
+telegram_latency = Histogram("bot_telegram_request_duration_seconds", "Outgoing Bot API call latency", ("method",))
+telegram_errors = Counter("bot_telegram_errors_total", "Outgoing Bot API call errors", ("method", "error"))
+pool_acquire_wait = Histogram(
+    "bot_db_pool_acquire_wait_seconds", "Time spent waiting for a pool connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+def instrument_module(namespace, exclude=()):
+    """
+    Wraps every coroutine function and async generator function in a module
+    namespace with db_latency/db_errors.
+    """
+    import inspect
+
+    for name, func in list(namespace.items()):
+        if name.startswith("_") or name in exclude:
+            continue
+        if not callable(func) or getattr(func, "__module__", None) != namespace.get("__name__"):
+            continue
+        if inspect.isasyncgenfunction(func):
+            namespace[name] = _timed_gen(func, name)
+        elif inspect.iscoroutinefunction(func):
+            namespace[name] = _timed(func, name)
+
+
+def timed(func):
+    """Decorator form of instrument_module for single coroutine functions/methods."""
+    return _timed(func, func.__qualname__)
+
+
+def _timed(func, name):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            db_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            db_latency.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def _timed_gen(func, name):
+    # Only the time spent producing items is observed, not the consumer's work between them
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        gen = func(*args, **kwargs)
+        busy = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = await gen.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    db_errors.inc(name, type(e).__name__)
+                    raise
+                finally:
+                    busy += time.perf_counter() - started
+                yield item
+        finally:
+            await gen.aclose()
+            db_latency.observe(busy, name)
+    return wrapper
@@ -0,0 +1,36 @@
+import re
+
+# Uzbek/Russian Cyrillic -> Uzbek Latin, so both spellings share one search key
+CYR_TO_LAT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '',
+    'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+}
+
+_TRANSLIT = str.maketrans(CYR_TO_LAT)
+# o' / g' are written with many different apostrophes; all of them are dropped
+_APOSTROPHES = re.compile(r"['`ʻʼ‘’]")
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """Builds the search key stored in videos.search_key (and used for queries)."""
+    if not text:
+        return ""
+    text = text.lower().translate(_TRANSLIT)
+    text = _APOSTROPHES.sub("", text)
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def short_title(title, limit=60):
+    """First meaningful line of a caption, without the decorative prefixes."""
+    for line in (title or "").split('\n'):
+        clean = line.strip()
+        if clean and not clean.startswith(('🌍', '⭐', '⏳', '📖', '🔐', '___')):
+            clean = clean.replace('🎬', '').replace('Nomi:', '').strip()
+            if clean:
+                return clean[:limit]
+    return (title or "")[:limit]
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import mimetypes
+import os
+
+from utils.http_cache import CachedBody
+
+logger = logging.getLogger(__name__)
+
+_TEXT_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def _scan(root):
+    """Returns {relative path: (mtime, size)} for every file under root."""
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            st = os.stat(path)
+            files[os.path.relpath(path, root).replace(os.sep, "/")] = (st.st_mtime, st.st_size)
+    return files
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class StaticAssets:
+    """
+    Keeps every file of a directory in memory as a precompressed CachedBody.
+
+    A background task re-scans the directory and reloads changed files, so
+    request handlers never touch the disk.
+    """
+
+    def __init__(self, root, poll_interval=5):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._assets = {}
+        self._stats = {}
+        self._task = None
+
+    def get(self, name):
+        return self._assets.get(name)
+
+    async def _load(self, name, mtime):
+        body = await asyncio.to_thread(_read, os.path.join(self.root, name))
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        charset = "utf-8" if content_type.startswith(_TEXT_TYPES) else None
+        self._assets[name] = await asyncio.to_thread(
+            CachedBody, body, content_type, charset, mtime
+        )
+
+    async def reload(self):
+        current = await asyncio.to_thread(_scan, self.root)
+        changed = [name for name, stat in current.items() if self._stats.get(name) != stat]
+        for name in changed:
+            await self._load(name, current[name][0])
+        for name in set(self._assets) - set(current):
+            del self._assets[name]
+        self._stats = current
+        return changed
+
+    async def start(self):
+        changed = await self.reload()
+        logger.info(f"📁 {len(changed)} ta statik fayl xotiraga yuklandi ({self.root}).")
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changed = await self.reload()
+                if changed:
+                    logger.info(f"📁 Statik fayllar yangilandi: {', '.join(changed)}")
+            except Exception as e:
+                logger.error(f"❌ Statik fayllarni qayta yuklab bo'lmadi: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
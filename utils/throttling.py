@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+from config import ADMINS
+
+THROTTLED_TEXT = "⏳ Juda tez! Iltimos, biroz kuting."
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Per-user token bucket that drops updates before any handler (and DB) runs.
+
+    `rate` tokens per second are refilled up to `burst`. Buckets of the least
+    recently active users are evicted once more than `max_users` are tracked.
+    An over-limit message gets one canned reply per throttled streak; an
+    over-limit callback is answered with a short alert-free notice.
+    """
+
+    def __init__(self, rate, burst, max_users=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets = OrderedDict()  # user_id -> [tokens, updated_at, warned]
+        self.dropped = 0
+
+    def _allow(self, user_id):
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = [float(self.burst), now, False]
+            self._buckets[user_id] = bucket
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True, False
+        first_drop = not bucket[2]
+        bucket[2] = True
+        return False, first_drop
+
+    async def __call__(self, handler, event, data):
+        user = getattr(event, "from_user", None)
+        if user is None or user.id in ADMINS:
+            return await handler(event, data)
+
+        allowed, first_drop = self._allow(user.id)
+        if allowed:
+            return await handler(event, data)
+
+        self.dropped += 1
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(THROTTLED_TEXT)
+            elif isinstance(event, Message) and first_drop:
+                await event.answer(THROTTLED_TEXT)
+        except Exception:
+            pass
+        return None
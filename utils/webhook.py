@@ -0,0 +1,62 @@
+import asyncio
+import hmac
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """
+    aiohttp handler for Telegram webhook updates.
+
+    Checks the secret token (requests are refused while none is configured), acknowledges right away and processes the update
+    in the background with at most `max_concurrency` updates in flight. When
+    `max_pending` updates are already queued it answers 503, so Telegram
+    retries later instead of us buffering without limit.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret, max_concurrency, max_pending):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks = set()
+
+    @property
+    def pending(self):
+        return len(self._tasks)
+
+    async def __call__(self, request: web.Request):
+        if not self.secret or not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        if len(self._tasks) >= self.max_pending:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Invalid webhook update: {e}")
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"Error processing update {update.update_id}: {e}")
+
+    async def drain(self, timeout=10):
+        """Waits for in-flight updates on shutdown."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
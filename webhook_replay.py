@@ -0,0 +1,71 @@
+"""
+Local test harness for webhook mode: POSTs recorded updates to the bot.
+
+    python webhook_replay.py updates.jsonl [--url http://localhost:8080/webhook] [--concurrency 10]
+
+The file holds one Telegram Update JSON per line (or a JSON array of updates).
+WEBHOOK_SECRET from .env is sent as the secret token header.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+async def replay(url, updates, concurrency, secret):
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies = []
+    statuses = {}
+
+    async def post(session, update):
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as resp:
+                await resp.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*[post(session, update) for update in updates])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Sent {len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:.1f}/s)")
+    print(f"Status codes: {statuses}")
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        print(f"Ack latency: p50={p50:.1f}ms p99={p99:.1f}ms")
+
+
+def main():
+    port = os.getenv("PORT", "8080")
+    path = os.getenv("WEBHOOK_PATH", "/webhook")
+    parser = argparse.ArgumentParser(description="POST recorded Telegram updates to the local webhook.")
+    parser.add_argument("file", help="JSON/JSONL file with recorded updates")
+    parser.add_argument("--url", default=f"http://localhost:{port}{path}")
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    updates = load_updates(args.file)
+    asyncio.run(replay(args.url, updates, args.concurrency, os.getenv("WEBHOOK_SECRET", "")))
+
+
+if __name__ == "__main__":
+    main()